@@ -1,14 +1,18 @@
 import os
-import json
+import orjson
+import asyncio
+import functools
 import logging
-from typing import List, Dict, Any, Optional
-from datetime import datetime
+from collections import defaultdict
+from typing import AsyncIterator, List, Dict, Any, Optional
+from datetime import datetime, timezone
 from fastapi import HTTPException
 from pydantic import BaseModel
 import google.generativeai as genai
 from dotenv import load_dotenv
+from cachetools import LRUCache, TTLCache
 
-from lib.supabase_client import supabase
+from lib.supabase_client import supabase, adb
 
 # Load environment variables
 load_dotenv()
@@ -24,6 +28,63 @@ if GEMINI_API_KEY:
 else:
     logger.warning("GEMINI_API_KEY not found in environment variables")
 
+GEMINI_MODEL_NAME = "gemini-2.0-flash-001"
+
+# Approximate token budget for previous conversation turns in each prompt
+HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "6000"))
+
+@functools.lru_cache(maxsize=8)
+def _get_model(model_name: str = GEMINI_MODEL_NAME) -> "genai.GenerativeModel":
+    """Return a shared GenerativeModel instance for the given model name"""
+    return genai.GenerativeModel(model_name)
+
+# Fixed parts of the chat prompt around the per-turn context
+_PROMPT_PREFIX = """You are an expert refrigerator technician and appliance repair specialist AI assistant. You help users with refrigerator-related questions based on a specific diagnosis that was performed on their refrigerator.
+
+GUIDELINES FOR RESPONSES:
+1. **Primary Focus**: Answer questions about the specific refrigerator diagnosis and solutions provided
+2. **Additional Help**: Provide general refrigerator maintenance, troubleshooting, and repair advice
+3. **Expertise Areas**: All refrigerator brands, models, common problems, repair techniques, safety procedures
+4. **Safety First**: Always emphasize safety warnings for electrical work, refrigerant handling, or complex repairs
+5. **Cost Awareness**: Provide realistic cost estimates for repairs vs replacement decisions
+6. **When to Call Professionals**: Clearly advise when professional service is needed
+
+CAPABILITIES:
+- Explain diagnosis results in simple terms
+- Clarify step-by-step repair instructions
+- Suggest alternative solutions or temporary fixes
+- Recommend maintenance schedules and best practices
+- Help identify refrigerator parts and tools needed
+- Provide troubleshooting for related issues
+- Explain warranty considerations
+- Compare repair costs vs replacement value
+
+RESPONSE STYLE:
+- Be conversational, helpful, and encouraging
+- Use clear, jargon-free explanations
+- Provide specific, actionable advice
+- Include safety reminders when relevant
+- Ask clarifying questions if needed
+
+"""
+
+_PROMPT_SUFFIX = """
+
+Based on the refrigerator diagnosis above and your expertise, please provide a helpful, detailed response to the user's question. If the question goes beyond the specific diagnosis, feel free to provide general refrigerator advice while relating it back to their specific situation when possible."""
+
+# Diagnoses are immutable once saved, so the formatted context block is cached
+# per diagnosis_id and only dropped when the diagnosis is deleted
+_diagnosis_context_cache: LRUCache = LRUCache(maxsize=1024)
+
+# Recently used conversations; kept current by appending messages as they are
+# saved and dropped on delete. The TTL bounds staleness across workers.
+_conversation_cache: TTLCache = TTLCache(maxsize=10_000, ttl=60)
+
+# Columns actually read from each table
+CONVERSATION_COLUMNS = "id,diagnosis_id,title,created_at,updated_at"
+MESSAGE_COLUMNS = "conversation_id,role,content,created_at"
+DIAGNOSIS_CONTEXT_COLUMNS = "file_name,brand,model,refrigerator_type,issue_category,severity_level,audio_summary,diagnosis_result,solutions"
+
 class ChatMessage(BaseModel):
     role: str  # 'user' or 'assistant'
     content: str
@@ -53,8 +114,8 @@ async def create_conversation(request: CreateConversationRequest) -> ChatConvers
     """Create a new chat conversation for a refrigerator diagnosis"""
     try:
         # Verify the diagnosis exists
-        diagnosis_response = supabase.table("refrigerator_diagnoses").select("*").eq("id", request.diagnosis_id).execute()
-        if not diagnosis_response.data:
+        diagnosis_response = await adb(lambda: supabase.table("refrigerator_diagnoses").select("id", count="exact", head=True).eq("id", request.diagnosis_id).execute())
+        if not diagnosis_response.count:
             raise HTTPException(status_code=404, detail="Refrigerator diagnosis not found")
         
         # Create conversation
@@ -63,12 +124,12 @@ async def create_conversation(request: CreateConversationRequest) -> ChatConvers
             "title": request.title
         }
         
-        response = supabase.table("chat_conversations").insert(conversation_data).execute()
+        response = await adb(lambda: supabase.table("chat_conversations").insert(conversation_data).execute())
         if not response.data:
             raise HTTPException(status_code=500, detail="Failed to create conversation")
         
         conversation = response.data[0]
-        return ChatConversation(
+        chat_conversation = ChatConversation(
             id=conversation["id"],
             diagnosis_id=conversation["diagnosis_id"],
             title=conversation["title"],
@@ -76,6 +137,8 @@ async def create_conversation(request: CreateConversationRequest) -> ChatConvers
             updated_at=conversation["updated_at"],
             messages=[]
         )
+        _conversation_cache[chat_conversation.id] = chat_conversation
+        return chat_conversation
         
     except Exception as e:
         logger.error(f"Error creating conversation: {str(e)}")
@@ -84,32 +147,33 @@ async def create_conversation(request: CreateConversationRequest) -> ChatConvers
 async def get_conversations(diagnosis_id: str) -> List[ChatConversation]:
     """Get all conversations for a refrigerator diagnosis"""
     try:
-        response = supabase.table("chat_conversations").select("*").eq("diagnosis_id", diagnosis_id).order("created_at", desc=True).execute()
+        response = await adb(lambda: supabase.table("chat_conversations").select(CONVERSATION_COLUMNS).eq("diagnosis_id", diagnosis_id).order("created_at", desc=True).execute())
+        if not response.data:
+            return []
         
-        conversations = []
-        for conv_data in response.data:
-            # Get messages for this conversation
-            messages_response = supabase.table("chat_messages").select("*").eq("conversation_id", conv_data["id"]).order("created_at", desc=False).execute()
-            
-            messages = [
-                ChatMessage(
-                    role=msg["role"],
-                    content=msg["content"],
-                    created_at=msg["created_at"]
-                )
-                for msg in messages_response.data
-            ]
-            
-            conversations.append(ChatConversation(
+        # Get messages for all conversations in a single query
+        conversation_ids = [conv_data["id"] for conv_data in response.data]
+        messages_response = await adb(lambda: supabase.table("chat_messages").select(MESSAGE_COLUMNS).in_("conversation_id", conversation_ids).order("created_at", desc=False).execute())
+        
+        messages_by_conversation: Dict[str, List[ChatMessage]] = defaultdict(list)
+        for msg in messages_response.data:
+            messages_by_conversation[msg["conversation_id"]].append(ChatMessage(
+                role=msg["role"],
+                content=msg["content"],
+                created_at=msg["created_at"]
+            ))
+        
+        return [
+            ChatConversation(
                 id=conv_data["id"],
                 diagnosis_id=conv_data["diagnosis_id"],
                 title=conv_data["title"],
                 created_at=conv_data["created_at"],
                 updated_at=conv_data["updated_at"],
-                messages=messages
-            ))
-        
-        return conversations
+                messages=messages_by_conversation[conv_data["id"]]
+            )
+            for conv_data in response.data
+        ]
         
     except Exception as e:
         logger.error(f"Error getting conversations: {str(e)}")
@@ -117,17 +181,21 @@ async def get_conversations(diagnosis_id: str) -> List[ChatConversation]:
 
 async def get_conversation(conversation_id: str) -> ChatConversation:
     """Get a specific conversation with its messages"""
+    cached = _conversation_cache.get(conversation_id)
+    if cached is not None:
+        return cached
+    
     try:
-        # Get conversation
-        conv_response = supabase.table("chat_conversations").select("*").eq("id", conversation_id).execute()
+        # Get conversation and its messages concurrently
+        conv_response, messages_response = await asyncio.gather(
+            adb(lambda: supabase.table("chat_conversations").select(CONVERSATION_COLUMNS).eq("id", conversation_id).execute()),
+            adb(lambda: supabase.table("chat_messages").select(MESSAGE_COLUMNS).eq("conversation_id", conversation_id).order("created_at", desc=False).execute())
+        )
         if not conv_response.data:
             raise HTTPException(status_code=404, detail="Conversation not found")
         
         conv_data = conv_response.data[0]
         
-        # Get messages
-        messages_response = supabase.table("chat_messages").select("*").eq("conversation_id", conversation_id).order("created_at", desc=False).execute()
-        
         messages = [
             ChatMessage(
                 role=msg["role"],
@@ -137,7 +205,7 @@ async def get_conversation(conversation_id: str) -> ChatConversation:
             for msg in messages_response.data
         ]
         
-        return ChatConversation(
+        conversation = ChatConversation(
             id=conv_data["id"],
             diagnosis_id=conv_data["diagnosis_id"],
             title=conv_data["title"],
@@ -145,37 +213,16 @@ async def get_conversation(conversation_id: str) -> ChatConversation:
             updated_at=conv_data["updated_at"],
             messages=messages
         )
+        _conversation_cache[conversation_id] = conversation
+        return conversation
         
     except Exception as e:
         logger.error(f"Error getting conversation: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to get conversation: {str(e)}")
 
-async def send_message(request: SendMessageRequest) -> ChatResponse:
-    """Send a message and get AI response about refrigerator diagnosis"""
-    try:
-        # Get conversation and verify it exists
-        conversation = await get_conversation(request.conversation_id)
-        
-        # Get the original refrigerator diagnosis for context
-        diagnosis_response = supabase.table("refrigerator_diagnoses").select("*").eq("id", conversation.diagnosis_id).execute()
-        if not diagnosis_response.data:
-            raise HTTPException(status_code=404, detail="Refrigerator diagnosis not found")
-        
-        diagnosis_data = diagnosis_response.data[0]
-        
-        # Save user message
-        user_message_data = {
-            "conversation_id": request.conversation_id,
-            "role": "user",
-            "content": request.message
-        }
-        
-        user_msg_response = supabase.table("chat_messages").insert(user_message_data).execute()
-        if not user_msg_response.data:
-            raise HTTPException(status_code=500, detail="Failed to save user message")
-        
-        # Prepare comprehensive refrigerator context for AI
-        context = f"""
+def _format_diagnosis_context(diagnosis_data: Dict[str, Any]) -> str:
+    """Format the refrigerator diagnosis block that prefixes every chat prompt"""
+    return f"""
 REFRIGERATOR DIAGNOSIS CONTEXT:
 File Name: {diagnosis_data.get('file_name', 'Unknown')}
 Brand: {diagnosis_data.get('brand', 'Unknown')}
@@ -195,72 +242,123 @@ SOLUTIONS PROVIDED:
 
 PREVIOUS CONVERSATION:
 """
+
+async def _get_diagnosis_context(diagnosis_id: str) -> str:
+    """Get the formatted diagnosis context, loading it from the database on a cache miss"""
+    context = _diagnosis_context_cache.get(diagnosis_id)
+    if context is None:
+        diagnosis_response = await adb(lambda: supabase.table("refrigerator_diagnoses").select(DIAGNOSIS_CONTEXT_COLUMNS).eq("id", diagnosis_id).execute())
+        if not diagnosis_response.data:
+            raise HTTPException(status_code=404, detail="Refrigerator diagnosis not found")
         
-        # Add previous messages to context
-        for msg in conversation.messages:
-            context += f"{msg.role.capitalize()}: {msg.content}\n"
-        
-        # Add current user message
-        context += f"User: {request.message}\n"
-        
-        # Generate AI response using Gemini
-        if not GEMINI_API_KEY:
-            raise HTTPException(status_code=500, detail="Gemini API key not configured")
-        
-        try:
-            model = genai.GenerativeModel('gemini-2.0-flash-001')
-            
-            prompt = f"""You are an expert refrigerator technician and appliance repair specialist AI assistant. You help users with refrigerator-related questions based on a specific diagnosis that was performed on their refrigerator.
+        context = _format_diagnosis_context(diagnosis_response.data[0])
+        _diagnosis_context_cache[diagnosis_id] = context
+    return context
 
-GUIDELINES FOR RESPONSES:
-1. **Primary Focus**: Answer questions about the specific refrigerator diagnosis and solutions provided
-2. **Additional Help**: Provide general refrigerator maintenance, troubleshooting, and repair advice
-3. **Expertise Areas**: All refrigerator brands, models, common problems, repair techniques, safety procedures
-4. **Safety First**: Always emphasize safety warnings for electrical work, refrigerant handling, or complex repairs
-5. **Cost Awareness**: Provide realistic cost estimates for repairs vs replacement decisions
-6. **When to Call Professionals**: Clearly advise when professional service is needed
+def _append_cached_message(conversation_id: str, message: ChatMessage) -> None:
+    """Keep a cached conversation in step with a message that was just saved"""
+    conversation = _conversation_cache.get(conversation_id)
+    if conversation is not None:
+        conversation.messages = [*conversation.messages, message]
 
-CAPABILITIES:
-- Explain diagnosis results in simple terms
-- Clarify step-by-step repair instructions
-- Suggest alternative solutions or temporary fixes
-- Recommend maintenance schedules and best practices
-- Help identify refrigerator parts and tools needed
-- Provide troubleshooting for related issues
-- Explain warranty considerations
-- Compare repair costs vs replacement value
+def invalidate_diagnosis_context(diagnosis_id: str) -> None:
+    """Drop the cached context for a diagnosis that was changed or deleted"""
+    _diagnosis_context_cache.pop(str(diagnosis_id), None)
 
-RESPONSE STYLE:
-- Be conversational, helpful, and encouraging
-- Use clear, jargon-free explanations
-- Provide specific, actionable advice
-- Include safety reminders when relevant
-- Ask clarifying questions if needed
+def _recent_history(messages: List[ChatMessage]) -> List[ChatMessage]:
+    """Return the newest messages that fit in the history token budget"""
+    budget = HISTORY_TOKEN_BUDGET
+    recent: List[ChatMessage] = []
+    for msg in reversed(messages):
+        # Rough estimate of about 4 characters per token
+        cost = len(msg.content) // 4 + 1
+        if cost > budget:
+            break
+        budget -= cost
+        recent.append(msg)
+    recent.reverse()
+    return recent
 
-{context}
+async def _prepare_prompt(request: SendMessageRequest) -> str:
+    """Save the user message and build the Gemini prompt for a chat turn"""
+    # Get conversation and verify it exists
+    conversation = await get_conversation(request.conversation_id)
+    previous_messages = conversation.messages
+    
+    # Get the refrigerator diagnosis context and save the user message concurrently
+    user_message_data = {
+        "conversation_id": request.conversation_id,
+        "role": "user",
+        "content": request.message
+    }
+    
+    # Nothing from the inserted user row is needed, so skip sending it back;
+    # a failed insert still raises from execute()
+    context, _ = await asyncio.gather(
+        _get_diagnosis_context(conversation.diagnosis_id),
+        adb(lambda: supabase.table("chat_messages").insert(user_message_data, returning="minimal").execute())
+    )
+    _append_cached_message(request.conversation_id, ChatMessage(
+        role="user",
+        content=request.message,
+        created_at=datetime.now(timezone.utc)
+    ))
+    
+    # Add the most recent previous messages and the current user message to context
+    recent_messages = _recent_history(previous_messages)
+    lines = [f"{msg.role.capitalize()}: {msg.content}" for msg in recent_messages]
+    omitted = len(previous_messages) - len(recent_messages)
+    if omitted:
+        lines.insert(0, f"({omitted} earlier messages omitted)")
+    lines.append(f"User: {request.message}")
+    context = context + "\n".join(lines) + "\n"
+    
+    return _PROMPT_PREFIX + context + _PROMPT_SUFFIX
 
-Based on the refrigerator diagnosis above and your expertise, please provide a helpful, detailed response to the user's question. If the question goes beyond the specific diagnosis, feel free to provide general refrigerator advice while relating it back to their specific situation when possible."""
+async def _save_ai_message(conversation_id: str, content: str) -> Dict[str, Any]:
+    """Persist an assistant message and return the inserted row"""
+    ai_message_data = {
+        "conversation_id": conversation_id,
+        "role": "assistant",
+        "content": content
+    }
+    
+    ai_msg_response = await adb(lambda: supabase.table("chat_messages").insert(ai_message_data).execute())
+    if not ai_msg_response.data:
+        raise HTTPException(status_code=500, detail="Failed to save AI message")
+    
+    ai_message = ai_msg_response.data[0]
+    _append_cached_message(conversation_id, ChatMessage(
+        role="assistant",
+        content=content,
+        created_at=ai_message["created_at"]
+    ))
+    return ai_message
+
+async def send_message(request: SendMessageRequest) -> ChatResponse:
+    """Send a message and get AI response about refrigerator diagnosis"""
+    try:
+        # Generate AI response using Gemini
+        if not GEMINI_API_KEY:
+            raise HTTPException(status_code=500, detail="Gemini API key not configured")
+        
+        prompt = await _prepare_prompt(request)
+        
+        try:
+            model = _get_model()
             
-            response = model.generate_content(prompt)
+            response = await asyncio.to_thread(model.generate_content, prompt)
             ai_response_text = response.text if hasattr(response, 'text') else str(response)
             
             # Save AI message
-            ai_message_data = {
-                "conversation_id": request.conversation_id,
-                "role": "assistant",
-                "content": ai_response_text
-            }
-            
-            ai_msg_response = supabase.table("chat_messages").insert(ai_message_data).execute()
-            if not ai_msg_response.data:
-                raise HTTPException(status_code=500, detail="Failed to save AI message")
+            ai_message = await _save_ai_message(request.conversation_id, ai_response_text)
             
             return ChatResponse(
                 conversation_id=request.conversation_id,
                 message=ChatMessage(
                     role="assistant",
                     content=ai_response_text,
-                    created_at=ai_msg_response.data[0]["created_at"]
+                    created_at=ai_message["created_at"]
                 )
             )
         
@@ -272,11 +370,74 @@ Based on the refrigerator diagnosis above and your expertise, please provide a h
         logger.error(f"Error sending message: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to send message: {str(e)}")
 
+def _chunk_text(chunk: Any) -> str:
+    """Return the text of a stream chunk, or "" for finish-only and blocked chunks"""
+    # chunk.text raises ValueError when the chunk carries no parts
+    if not chunk.candidates:
+        return ""
+    return "".join(part.text for part in chunk.candidates[0].content.parts)
+
+async def stream_message(request: SendMessageRequest) -> AsyncIterator[bytes]:
+    """Save the user message and return a stream of the AI response as NDJSON events
+    
+    Setup failures raise HTTPException before anything is streamed.
+    """
+    if not GEMINI_API_KEY:
+        raise HTTPException(status_code=500, detail="Gemini API key not configured")
+    
+    try:
+        prompt = await _prepare_prompt(request)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error sending message: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to send message: {str(e)}")
+    
+    return _stream_reply(request.conversation_id, prompt)
+
+async def _stream_reply(conversation_id: str, prompt: str) -> AsyncIterator[bytes]:
+    """Stream the AI response to a prepared prompt and save it once complete"""
+    try:
+        model = _get_model()
+        
+        # The SDK stream is a blocking iterator, so pull each chunk off the event loop
+        response = await asyncio.to_thread(model.generate_content, prompt, stream=True)
+        chunks = iter(response)
+        parts: List[str] = []
+        while True:
+            chunk = await asyncio.to_thread(next, chunks, None)
+            if chunk is None:
+                break
+            text = _chunk_text(chunk)
+            if text:
+                parts.append(text)
+                yield orjson.dumps({"type": "token", "content": text}) + b"\n"
+        
+        ai_response_text = "".join(parts)
+        ai_message = await _save_ai_message(conversation_id, ai_response_text)
+        
+        yield orjson.dumps({
+            "type": "complete",
+            "conversation_id": conversation_id,
+            "message": {
+                "role": "assistant",
+                "content": ai_response_text,
+                "created_at": ai_message["created_at"]
+            }
+        }) + b"\n"
+    
+    except Exception as e:
+        detail = e.detail if isinstance(e, HTTPException) else str(e)
+        logger.error(f"Error streaming message: {detail}")
+        yield orjson.dumps({"type": "error", "message": f"Failed to send message: {detail}"}) + b"\n"
+
 async def delete_conversation(conversation_id: str) -> bool:
     """Delete a conversation and all its messages"""
     try:
+        _conversation_cache.pop(conversation_id, None)
+        
         # Delete conversation (messages will be deleted automatically due to CASCADE)
-        response = supabase.table("chat_conversations").delete().eq("id", conversation_id).execute()
+        response = await adb(lambda: supabase.table("chat_conversations").delete().eq("id", conversation_id).execute())
         return len(response.data) > 0
         
     except Exception as e:
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from typing import List
 from .chat import (
     ChatConversation, 
@@ -9,6 +10,7 @@ from .chat import (
     get_conversations,
     get_conversation,
     send_message,
+    stream_message,
     delete_conversation
 )
 
@@ -34,6 +36,19 @@ async def send_chat_message(request: SendMessageRequest):
     """Send a message and get AI response"""
     return await send_message(request)
 
+@router.post("/chat/message/stream")
+async def stream_chat_message(request: SendMessageRequest):
+    """Send a message and stream the AI response as newline-delimited JSON"""
+    # Awaited here so a missing conversation or failed setup gets a real status code
+    return StreamingResponse(
+        await stream_message(request),
+        media_type="application/x-ndjson",
+        headers={
+            'Cache-Control': 'no-cache',
+            'Connection': 'keep-alive',
+        }
+    )
+
 @router.delete("/chat/conversation/{conversation_id}")
 async def delete_chat_conversation(conversation_id: str):
     """Delete a conversation and all its messages"""
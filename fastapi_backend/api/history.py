@@ -7,7 +7,8 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
-from lib.supabase_client import supabase
+from lib.supabase_client import supabase, adb
+from api.chat import invalidate_diagnosis_context
 
 router = APIRouter()
 
@@ -45,7 +46,9 @@ async def get_refrigerator_diagnoses_history():
                 detail={"error": "Database service not available. Please configure Supabase environment variables."}
             )
             
-        result = supabase.table('refrigerator_diagnoses').select('*').order('created_at', desc=True).execute()
+        # The view already exposes the response field names; views carry no
+        # guaranteed row order, so sort here
+        result = await adb(lambda: supabase.table('refrigerator_diagnoses_camel').select('*').order('createdAt', desc=True).execute())
         
         if result.data is None:
             logger.error('Failed to fetch refrigerator diagnoses from database')
@@ -54,25 +57,9 @@ async def get_refrigerator_diagnoses_history():
                 detail={"error": "Failed to fetch refrigerator diagnoses"}
             )
 
-        processed_diagnoses = []
-        for diagnosis in result.data:
-            # Process each diagnosis to match the expected format
-            processed_diagnosis = RefrigeratorDiagnosisItem(
-                id=str(diagnosis.get('id', '')),
-                videoId=diagnosis.get('video_id', ''),
-                fileName=diagnosis.get('file_name', ''),
-                brand=diagnosis.get('brand'),
-                model=diagnosis.get('model'),
-                issueCategory=diagnosis.get('issue_category'),
-                severityLevel=diagnosis.get('severity_level'),
-                diagnosisResult=diagnosis.get('diagnosis_result', ''),
-                solutions=diagnosis.get('solutions', ''),
-                audioSummary=diagnosis.get('audio_summary'),
-                createdAt=diagnosis.get('created_at', '')
-            )
-            processed_diagnoses.append(processed_diagnosis)
-
-        return HistoryResponse(diagnoses=processed_diagnoses)
+        # Rows already have the response shape, so hand them to the response
+        # model as-is; FastAPI validates them against HistoryResponse once
+        return {"diagnoses": result.data}
         
     except HTTPException:
         raise
@@ -94,23 +81,16 @@ async def delete_refrigerator_diagnosis(diagnosis_id: str):
                 detail={"error": "Database service not available. Please configure Supabase environment variables."}
             )
         
-        # First, verify the diagnosis exists
-        diagnosis_result = supabase.table('refrigerator_diagnoses').select('*').eq('id', diagnosis_id).execute()
-        if not diagnosis_result.data:
+        # Delete the diagnosis, only asking for the number of affected rows
+        diagnosis_delete = await adb(lambda: supabase.table('refrigerator_diagnoses').delete(count='exact', returning='minimal').eq('id', diagnosis_id).execute())
+        
+        if not diagnosis_delete.count:
             raise HTTPException(
                 status_code=404,
                 detail={"error": "Refrigerator diagnosis not found"}
             )
         
-        # Delete the diagnosis
-        diagnosis_delete = supabase.table('refrigerator_diagnoses').delete().eq('id', diagnosis_id).execute()
-        
-        if not diagnosis_delete.data:
-            raise HTTPException(
-                status_code=500,
-                detail={"error": "Failed to delete refrigerator diagnosis"}
-            )
-        
+        invalidate_diagnosis_context(diagnosis_id)
         logger.info(f"Successfully deleted refrigerator diagnosis {diagnosis_id}")
         return DeleteResponse(
             success=True,
@@ -2,18 +2,17 @@ from fastapi import APIRouter, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, Dict, Any
-import json
+import orjson
 import asyncio
 import logging
-from datetime import datetime
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
-from lib.supabase_client import supabase
+from lib.supabase_client import supabase, adb
 from lib.aws_s3 import s3_downloader
-from lib.google_files import google_files_processor, RefrigeratorDiagnosisResult
+from lib.google_files import get_google_files_processor, RefrigeratorDiagnosisResult, UPLOAD_CHUNK_SIZE, SINGLE_REQUEST_UPLOAD_LIMIT
 
 router = APIRouter()
 
@@ -25,6 +24,29 @@ class RefrigeratorDiagnosisRequest(BaseModel):
     fileName: str
     userDescription: Optional[str] = None  # User's description of the refrigerator problem
 
+async def find_existing_diagnosis(s3_key: str, user_description: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Find a saved diagnosis for the same S3 video and problem description"""
+    if not supabase:
+        return None
+
+    try:
+        def query():
+            builder = supabase.table('refrigerator_diagnoses') \
+                .select('id,diagnosis_result,solutions,audio_summary') \
+                .eq('video_id', s3_key)
+            if user_description is None:
+                builder = builder.is_('user_description', 'null')
+            else:
+                builder = builder.eq('user_description', user_description)
+            return builder.order('created_at', desc=True).limit(1).execute()
+
+        result = await adb(query)
+        return result.data[0] if result.data else None
+    except Exception as error:
+        # A failed lookup only means the video gets diagnosed again
+        logger.warning(f'Failed to look up existing diagnosis: {str(error)}')
+        return None
+
 @router.post("/process-s3-video")
 async def process_s3_video(request: RefrigeratorDiagnosisRequest):
     """Diagnose refrigerator issues from S3 video with streaming response"""
@@ -39,72 +61,122 @@ async def process_s3_video(request: RefrigeratorDiagnosisRequest):
 
     async def stream_response():
         try:
-            yield json.dumps({
+            google_files_processor = get_google_files_processor()
+            # Reuse an existing diagnosis of the same video and description
+            cached = await find_existing_diagnosis(request.s3Key, request.userDescription)
+            if cached:
+                logger.info(f"Returning existing diagnosis {cached['id']} for {request.s3Key}")
+                yield orjson.dumps({
+                    'type': 'complete',
+                    'message': 'Refrigerator diagnosis completed successfully!',
+                    'progress': 100,
+                    'diagnosis_result': cached['diagnosis_result'],
+                    'solutions': cached['solutions'],
+                    'audio_summary': cached['audio_summary'],
+                    'diagnosisId': str(cached['id']),
+                    'fileName': request.fileName,
+                    's3Key': request.s3Key
+                }) + b'\n'
+                return
+
+            yield orjson.dumps({
                 'type': 'progress',
                 'message': 'Downloading refrigerator video from S3...',
                 'progress': 10
-            }) + '\n'
+            }) + b'\n'
 
-            # Step 1: Download from S3
-            download_result = await s3_downloader.download_file(request.s3Key)
+            # Step 1: Open the S3 object as a chunked stream
+            s3_object = await s3_downloader.open_download_stream(request.s3Key, UPLOAD_CHUNK_SIZE)
+            file_size = s3_object['contentLength']
             
-            yield json.dumps({
+            yield orjson.dumps({
                 'type': 'progress',
                 'message': 'Uploading to AI analysis service...',
                 'progress': 30
-            }) + '\n'
-
-            # Step 2: Upload to Google Files API
-            upload_result = await google_files_processor.upload_to_google_files(
-                download_result['buffer'],
-                request.fileName,
-                download_result['contentType']
-            )
-
-            yield json.dumps({
-                'type': 'progress',
-                'message': 'Waiting for video processing...',
-                'progress': 50
-            }) + '\n'
-
-            # Step 3: Wait for Google processing
-            await google_files_processor.wait_for_file_processing(upload_result.name)
-
-            yield json.dumps({
-                'type': 'progress',
-                'message': 'Analyzing refrigerator and diagnosing issues...',
-                'progress': 70
-            }) + '\n'
-
-            # Step 4: Process with refrigerator-specific AI
-            result = await google_files_processor.process_refrigerator_video(
-                upload_result.file_uri,
-                upload_result.name,
-                download_result['contentType'],
-                request.userDescription
-            )
-
-            yield json.dumps({
+            }) + b'\n'
+
+            # Step 2: Stream the chunks straight into Google Files; small videos
+            # go up in a single request without the resumable handshake
+            if file_size < SINGLE_REQUEST_UPLOAD_LIMIT:
+                upload_result = await google_files_processor.upload_to_google_files(
+                    s3_object['chunks'],
+                    request.fileName,
+                    s3_object['contentType'],
+                    file_size
+                )
+            else:
+                upload_result = None
+                async with google_files_processor.open_resumable_upload(
+                    request.fileName,
+                    s3_object['contentType'],
+                    file_size
+                ) as upload:
+                    # Upload frames are only sent when the percentage moves forward
+                    last_progress = 30
+                    async for chunk in s3_object['chunks']:
+                        upload_result = await upload.send(chunk)
+                        progress = 30 + (20 * upload.offset) // file_size
+                        if progress <= last_progress:
+                            continue
+                        last_progress = progress
+                        yield orjson.dumps({
+                            'type': 'progress',
+                            'message': 'Uploading to AI analysis service...',
+                            'progress': progress
+                        }) + b'\n'
+
+            if upload_result is None:
+                raise Exception('Video upload ended before the whole file was sent')
+
+            # The same video content may already have cached Gemini responses
+            result = google_files_processor.get_cached_diagnosis(upload_result.sha256, request.userDescription)
+            if result is None:
+                yield orjson.dumps({
+                    'type': 'progress',
+                    'message': 'Waiting for video processing...',
+                    'progress': 50
+                }) + b'\n'
+
+                # Step 3: Wait for Google processing
+                await google_files_processor.wait_for_file_processing(upload_result.name)
+
+                yield orjson.dumps({
+                    'type': 'progress',
+                    'message': 'Analyzing refrigerator and diagnosing issues...',
+                    'progress': 70
+                }) + b'\n'
+
+                # Step 4: Process with refrigerator-specific AI
+                result = await google_files_processor.process_refrigerator_video(
+                    upload_result.file_uri,
+                    upload_result.name,
+                    s3_object['contentType'],
+                    request.userDescription,
+                    upload_result.sha256
+                )
+
+            yield orjson.dumps({
                 'type': 'progress',
                 'message': 'Cleaning up temporary files...',
                 'progress': 85
-            }) + '\n'
+            }) + b'\n'
 
             # Step 5: Cleanup Google Files
             await google_files_processor.delete_google_file(upload_result.name)
 
-            yield json.dumps({
+            yield orjson.dumps({
                 'type': 'progress',
                 'message': 'Saving diagnosis to database...',
                 'progress': 90
-            }) + '\n'
+            }) + b'\n'
 
             # Step 6: Save to database
             try:
                 if not supabase:
                     raise Exception('Database service not available. Please configure Supabase environment variables.')
                     
-                db_result = supabase.table('refrigerator_diagnoses').insert({
+                # save_diagnosis inserts the row and returns only its id
+                db_result = await adb(lambda: supabase.rpc('save_diagnosis', {'diagnosis': {
                     'video_id': request.s3Key,
                     'file_name': request.fileName,
                     'video_url': f's3://{request.s3Key}',
@@ -117,38 +189,37 @@ async def process_s3_video(request: RefrigeratorDiagnosisRequest):
                     'diagnosis_result': result.diagnosis_result,
                     'solutions': result.solutions,
                     'audio_summary': result.audio_summary,
-                    'ai_model': 'gemini-2.0-flash-001',
-                    'created_at': datetime.utcnow().isoformat()
-                }).execute()
+                    'ai_model': 'gemini-2.0-flash-001'
+                }}).execute())
 
-                if not db_result.data:
-                    raise Exception('No data returned from database insert')
+                if db_result.data is None:
+                    raise Exception('No id returned from save_diagnosis')
 
-                diagnosis_data = db_result.data[0]
+                diagnosis_id = db_result.data
 
             except Exception as db_error:
                 logger.error(f'Database error: {str(db_error)}')
                 raise Exception('Failed to save diagnosis to database')
 
-            yield json.dumps({
+            yield orjson.dumps({
                 'type': 'complete',
                 'message': 'Refrigerator diagnosis completed successfully!',
                 'progress': 100,
                 'diagnosis_result': result.diagnosis_result,
                 'solutions': result.solutions,
                 'audio_summary': result.audio_summary,
-                'diagnosisId': str(diagnosis_data['id']),
+                'diagnosisId': str(diagnosis_id),
                 'fileName': request.fileName,
                 's3Key': request.s3Key
-            }) + '\n'
+            }) + b'\n'
 
         except Exception as error:
             logger.error(f'Refrigerator diagnosis failed: {str(error)}')
-            yield json.dumps({
+            yield orjson.dumps({
                 'type': 'error',
                 'message': str(error) if str(error) else 'Failed to diagnose refrigerator',
                 'progress': 0
-            }) + '\n'
+            }) + b'\n'
 
     return StreamingResponse(
         stream_response(),
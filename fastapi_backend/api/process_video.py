@@ -5,7 +5,7 @@ from typing import Optional, Dict, Any
 import json
 import asyncio
 import logging
-from datetime import datetime
+from datetime import datetime, timezone
 import re
 import time
 from dotenv import load_dotenv
@@ -259,7 +259,7 @@ async def process_video(video: UploadFile = File(...)):
                     'language': 'en',
                     'ai_model': 'gemini-2.0-flash-001',
                     'video_duration': 0,
-                    'created_at': datetime.utcnow().isoformat()
+                    'created_at': datetime.now(timezone.utc).isoformat()
                 }).execute()
 
                 if result.data:
@@ -5,7 +5,7 @@ from typing import Optional, Dict, Any
 import json
 import asyncio
 import logging
-from datetime import datetime
+from datetime import datetime, timezone
 import re
 from dotenv import load_dotenv
 
@@ -300,7 +300,7 @@ async def summarize_video(request: SummarizeRequest):
                     'language': request.language,
                     'ai_model': 'gemini-2.0-flash-001',
                     'video_duration': 0,
-                    'created_at': datetime.utcnow().isoformat()
+                    'created_at': datetime.now(timezone.utc).isoformat()
                 }).execute()
 
                 if result.data:
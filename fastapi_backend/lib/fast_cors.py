@@ -0,0 +1,52 @@
+import logging
+from typing import Any, List, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.cors import CORSMiddleware
+from starlette.types import ASGIApp, Message, Send
+
+logger = logging.getLogger(__name__)
+
+class FastCORSMiddleware(CORSMiddleware):
+    """CORSMiddleware that encodes its constant response headers once at startup"""
+
+    def __init__(self, app: ASGIApp, **kwargs: Any) -> None:
+        super().__init__(app, **kwargs)
+        # Starlette re-encodes and re-inserts these through MutableHeaders on every response
+        self._simple_raw_headers: List[Tuple[bytes, bytes]] = [
+            (name.lower().encode("latin-1"), value.encode("latin-1"))
+            for name, value in self.simple_headers.items()
+        ]
+        self._simple_header_names = frozenset(name for name, _ in self._simple_raw_headers)
+        # Origins are compared exactly, so look them up in a set rather than scanning a list
+        self._allowed_origin_set = frozenset(self.allow_origins)
+        for origin in self._allowed_origin_set:
+            if origin != "*" and ("*" in origin or origin.endswith("/")):
+                logger.warning(f"CORS origin {origin!r} is matched literally and will never match a browser Origin")
+
+    def is_allowed_origin(self, origin: str) -> bool:
+        if self.allow_all_origins or origin in self._allowed_origin_set:
+            return True
+        return self.allow_origin_regex is not None and self.allow_origin_regex.fullmatch(origin) is not None
+
+    async def send(self, message: Message, send: Send, request_headers: Headers) -> None:
+        if message["type"] != "http.response.start":
+            await send(message)
+            return
+
+        raw_headers = [
+            header for header in message.get("headers", ())
+            if header[0] not in self._simple_header_names
+        ]
+        raw_headers.extend(self._simple_raw_headers)
+        message["headers"] = raw_headers
+
+        # Mirror the origin back as the stock middleware does
+        origin = request_headers["Origin"]
+        if self.allow_all_origins:
+            if "cookie" in request_headers:
+                self.allow_explicit_origin(MutableHeaders(raw=raw_headers), origin)
+        elif self.is_allowed_origin(origin=origin):
+            self.allow_explicit_origin(MutableHeaders(raw=raw_headers), origin)
+
+        await send(message)
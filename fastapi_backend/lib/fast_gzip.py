@@ -0,0 +1,19 @@
+from typing import Any, Iterable
+
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+class StreamingGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware that passes streaming endpoints through uncompressed"""
+
+    def __init__(self, app: ASGIApp, excluded_paths: Iterable[str] = (), **kwargs: Any) -> None:
+        super().__init__(app, **kwargs)
+        # The gzip responder holds frames back until it has enough to compress,
+        # which would stall progress and token streams
+        self.excluded_paths = frozenset(excluded_paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and scope["path"] in self.excluded_paths:
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
@@ -1,7 +1,14 @@
 import os
+import re
 import json
+import hashlib
+import random
 import logging
-from typing import Dict, Any, Optional
+import tempfile
+import threading
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, Any, Optional, Union
+from contextlib import asynccontextmanager
 from dataclasses import dataclass
 from dotenv import load_dotenv
 
@@ -24,26 +31,108 @@ try:
     import aiohttp
     import asyncio
     import ssl
+    import certifi
     HTTP_CLIENT_AVAILABLE = True
 except ImportError as e:
     logger.error(f"HTTP client dependencies not available: {e}")
     HTTP_CLIENT_AVAILABLE = False
 
-# Create SSL context that can handle certificate verification issues
+# Create SSL context that verifies certificates against certifi's CA bundle
 def create_ssl_context():
     """Create SSL context with proper certificate handling"""
     if not HTTP_CLIENT_AVAILABLE:
         return None
     
     try:
-        ssl_context = ssl.create_default_context()
-        ssl_context.check_hostname = False
-        ssl_context.verify_mode = ssl.CERT_NONE
-        return ssl_context
+        return ssl.create_default_context(cafile=certifi.where())
     except Exception as e:
         logger.error(f"Failed to create SSL context: {e}")
         return None
 
+# Loading the CA bundle is slow, so one context is shared by every connection
+_ssl_context: Optional["ssl.SSLContext"] = None
+
+def get_ssl_context():
+    """Return the shared SSL context, creating it on first use"""
+    global _ssl_context
+    if _ssl_context is None:
+        _ssl_context = create_ssl_context()
+    return _ssl_context
+
+# Chunk size for streamed resumable uploads (must be a multiple of 256 KiB)
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+# Files below this size go up in one multipart request, skipping the resumable handshake
+SINGLE_REQUEST_UPLOAD_LIMIT = 5 * 1024 * 1024
+
+DIAGNOSIS_MODEL_NAME = "gemini-2.0-flash-001"
+# Bump when the diagnosis prompts change so cached responses are not reused
+PROMPT_VERSION = "2"
+
+# Leading meta-commentary stripped from model outputs, applied in order. Each
+# rule lists the casefolded literals its pattern can start with, so a rule only
+# runs when the text actually begins with one of them. Negated classes stop at
+# the delimiter directly instead of backtracking a lazy .*?. IGNORECASE stays:
+# the patterns are anchored, so lowercasing the text to match lowercase
+# literals costs more than the case-folding compares it saves
+_CLEANUP_RULES = tuple((prefixes, re.compile(pattern, re.IGNORECASE)) for prefixes, pattern in (
+    (('okay', 'here', 'let me', 'i will', 'i\'ll', 'i can', 'i would', 'i am going to', 'allow me to', 'sure', 'of course', 'certainly', 'alright'),
+     r'^(Okay|Here\'?s?( is)?|Let me|I will|I\'ll|I can|I would|I am going to|Allow me to|Sure|Of course|Certainly|Alright)[^,\n]*,\s*'),
+    (('here', 'i\'l', 'il', 'let me', 'i will', 'i can', 'i would', 'i am going to', 'allow me to', 'sure', 'of course', 'certainly'),
+     r'^(Here\'?s?( is)?|I\'?ll?|Let me|I will|I can|I would|I am going to|Allow me to|Sure|Of course|Certainly).*?(summary|translate|breakdown|analysis)[^:\n]*:\s*'),
+    (('based on', 'according to'),
+     r'^(Based on|According to)[^,\n]*,\s*'),
+    (('i understand',),
+     r'^I understand[^.!\n]*[.!]\s*'),
+    (('now', 'first', 'let\'s'),
+     r'^(Now|First|Let\'s),?\s*'),
+    (('here are', 'the following is', 'this is', 'below is'),
+     r'^(Here are|The following is|This is|Below is)[^:\n]*:\s*'),
+    (('i\'ll provide', 'let me break', 'i\'ll break', 'i\'ll help', 'i\'ve structured'),
+     r'^(I\'ll provide|Let me break|I\'ll break|I\'ll help|I\'ve structured)[^:\n]*:\s*'),
+    (('as requested', 'following your', 'in response to'),
+     r'^(As requested|Following your|In response to)[^:\n]*:\s*'),
+))
+
+_all_cleanup_prefixes = {prefix for prefixes, _ in _CLEANUP_RULES for prefix in prefixes}
+
+# Prefixes that extend a shorter one ("here are" after "here") can never decide the guard
+_CLEANUP_PREFIXES = tuple(sorted(
+    prefix for prefix in _all_cleanup_prefixes
+    if not prefix.startswith(tuple(_all_cleanup_prefixes - {prefix}))
+))
+
+_FIELD_DEFAULTS = {
+    'brand': 'Unable to determine',
+    'model': 'Unable to determine',
+    'refrigerator_type': 'Standard',
+    'issue_category': 'General Issue',
+    'severity_level': 'Moderate'
+}
+
+# Diagnosis line labels (lowercased) and the field each one fills
+_FIELD_LABELS = {
+    'brand': 'brand',
+    'model number': 'model',
+    'model': 'model',
+    'refrigerator type': 'refrigerator_type',
+    'type': 'refrigerator_type',
+    'primary issue category': 'issue_category',
+    'issue category': 'issue_category',
+    'problem category': 'issue_category',
+    'severity assessment': 'severity_level',
+    'severity': 'severity_level',
+    'difficulty': 'severity_level',
+}
+
+# Markdown emphasis and bullet characters allowed around a label
+_LABEL_DECORATION = ' \t*_-•#>'
+
+# Placeholder values that do not count as a detected brand or model
+_FIELD_EXCLUDED_VALUES = {
+    'brand': frozenset({'unable to determine', 'not visible', 'unknown'}),
+    'model': frozenset({'unable to determine', 'not visible', 'unknown', 'not visible in video'}),
+}
+
 @dataclass
 class GoogleFileUploadResult:
     file_uri: str
@@ -51,6 +140,7 @@ class GoogleFileUploadResult:
     mime_type: str
     size_bytes: str
     state: str
+    sha256: Optional[str] = None
 
 @dataclass
 class RefrigeratorDiagnosisResult:
@@ -64,8 +154,340 @@ class RefrigeratorDiagnosisResult:
     severity_level: str
     duration: Optional[int] = None
 
+def _chunk_text(chunk: Any) -> str:
+    """Return the text of a streamed response chunk, or "" for finish-only and blocked chunks"""
+    # chunk.text raises ValueError when the chunk carries no parts
+    if not chunk.candidates:
+        return ""
+    return "".join(part.text for part in chunk.candidates[0].content.parts)
+
+async def _aligned_chunks(chunks: AsyncIterator[bytes], chunk_size: int) -> AsyncIterator[bytes]:
+    """Regroup a byte stream into chunk_size pieces, as resumable uploads require"""
+    buffer = bytearray()
+    async for data in chunks:
+        buffer += data
+        while len(buffer) >= chunk_size:
+            yield bytes(buffer[:chunk_size])
+            del buffer[:chunk_size]
+    if buffer:
+        yield bytes(buffer)
+
+class GoogleResumableUpload:
+    """An open resumable upload session that accepts the file in sequential chunks"""
+
+    def __init__(self, session: "aiohttp.ClientSession", upload_url: str, size: int):
+        self.session = session
+        self.upload_url = upload_url
+        self.size = size
+        self.offset = 0
+        # Hash the content as it streams through so responses can be cached by video
+        self._digest = hashlib.sha256()
+
+    async def send(self, chunk: bytes) -> Optional[GoogleFileUploadResult]:
+        """Upload the next chunk; returns the file once the final chunk is accepted"""
+        finalize = self.offset + len(chunk) >= self.size
+        upload_headers = {
+            'Content-Length': str(len(chunk)),
+            'X-Goog-Upload-Offset': str(self.offset),
+            'X-Goog-Upload-Command': 'upload, finalize' if finalize else 'upload',
+        }
+
+        async with self.session.post(self.upload_url, headers=upload_headers, data=chunk) as upload_response:
+            if not upload_response.ok:
+                error_text = await upload_response.text()
+                logger.error('Failed to upload file data', {
+                    'status': upload_response.status,
+                    'error': error_text
+                })
+                raise Exception(f"Failed to upload file data: {upload_response.status} - {error_text}")
+
+            self._digest.update(chunk)
+            self.offset += len(chunk)
+            if not finalize:
+                return None
+
+            result = await upload_response.json()
+            return _upload_result(result, self._digest.hexdigest())
+
+def _upload_result(result: Dict[str, Any], sha256: str) -> GoogleFileUploadResult:
+    """Build the upload result from a finished upload response"""
+    logger.info('File uploaded successfully to Google Files API', result)
+
+    # Check if the response has the expected structure
+    if not result.get('file') or not result['file'].get('name') or not result['file'].get('uri'):
+        logger.error('Unexpected upload response format', result)
+        raise Exception('Google Files API returned unexpected response format')
+
+    return GoogleFileUploadResult(
+        file_uri=result['file']['uri'],
+        name=result['file']['name'],
+        mime_type=result['file']['mimeType'],
+        size_bytes=result['file']['sizeBytes'],
+        state=result['file']['state'],
+        sha256=sha256,
+    )
+
+class ExtractionCache:
+    """Content-addressed cache of Gemini responses stored as one JSON file per key"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(*parts: str) -> str:
+        """Hash the parts with length prefixes so different splits never collide"""
+        digest = hashlib.sha256()
+        for part in parts:
+            data = part.encode('utf-8')
+            digest.update(len(data).to_bytes(8, 'big'))
+            digest.update(data)
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response text, or None on a miss"""
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                return json.load(f)['text']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, key: str, text: str, **metadata: str) -> None:
+        """Store a response; write to a temp file first so readers never see partial JSON"""
+        entry = {
+            'text': text,
+            'createdAt': datetime.now(timezone.utc).isoformat(),
+            **metadata
+        }
+        try:
+            with tempfile.NamedTemporaryFile('w', dir=self.directory, suffix='.tmp', delete=False, encoding='utf-8') as f:
+                json.dump(entry, f)
+            os.replace(f.name, self._path(key))
+        except OSError as e:
+            logger.warning(f'Failed to write Gemini response cache entry: {e}')
+
+# Opt-in on-disk cache of Gemini responses, keyed by video content and prompt inputs
+_response_cache = ExtractionCache(os.environ['GEMINI_CACHE_DIR']) if os.getenv('GEMINI_CACHE_DIR') else None
+
+def _response_cache_key(file_sha256: str, *parts: str) -> str:
+    return ExtractionCache.key(file_sha256, DIAGNOSIS_MODEL_NAME, PROMPT_VERSION, *parts)
+
+def _cached_response(file_sha256: Optional[str], *parts: str) -> Optional[str]:
+    if _response_cache is None or not file_sha256:
+        return None
+    return _response_cache.get(_response_cache_key(file_sha256, *parts))
+
+# Gemini prompts; the templates are filled in with str.format_map per video
+_AUDIO_ANALYSIS_PROMPT = """
+Analyze the audio content of this refrigerator video and extract only the key problem information:
+
+**EXTRACT ONLY:**
+- Main refrigerator problem described
+- Any error codes or display messages mentioned
+- Specific symptoms mentioned (sounds, temperatures, functions not working)
+- Brand/model information if mentioned
+- Any previous troubleshooting attempts mentioned
+
+**FORMAT:** Provide a brief summary (2-3 sentences) of the key problem information from the audio.
+**DO NOT:** Provide timestamps or detailed transcription.
+"""
+
+_SOLUTIONS_PROMPT_TMPL = """
+Based on the refrigerator problem analysis, provide comprehensive step-by-step solutions. You are providing expert repair guidance.
+
+**PROBLEM CONTEXT:** {user_description}
+
+Provide solutions in this EXACT format:
+
+🔧 **PRIMARY SOLUTION (Recommended)**
+**Solution Name:** [Clear, descriptive name of the fix]
+**Solution Type:** [DIY Simple, DIY Moderate, Professional Required]
+**Time Required:** [Realistic time estimate: "5-10 minutes", "30-45 minutes", "1-2 hours"]
+**Difficulty Level:** [Easy, Medium, Hard]
+**Success Rate:** [High, Medium, Low - based on common success of this fix]
+
+**TOOLS & MATERIALS NEEDED:**
+• [List specific tools required]
+• [List any replacement parts needed with part numbers if known]
+• [List any supplies like cleaning materials, lubricants, etc.]
+
+**DETAILED STEP-BY-STEP INSTRUCTIONS:**
+**Preparation:**
+1. [Safety preparation steps]
+2. [Power/water disconnection if needed]
+3. [Access preparation]
+
+**Main Repair Steps:**
+1. [Detailed step with specific actions]
+2. [Include what to look for, how to test]
+3. [Continue with precise instructions]
+4. [Include reassembly steps]
+5. [Testing and verification steps]
+
+**TROUBLESHOOTING:**
+• If [specific issue occurs]: [How to resolve]
+• If problem persists: [Next steps to try]
+
+**SAFETY WARNINGS:**
+⚠️ [List all safety precautions specific to this repair]
+⚠️ [Electrical safety if applicable]
+⚠️ [When to stop and call professional]
+
+---
+
+🔧 **ALTERNATIVE SOLUTION** (If primary doesn't work)
+**Solution Name:** [Alternative approach name]
+**Solution Type:** [DIY Simple, DIY Moderate, Professional Required]
+**Time Required:** [Time estimate]
+**Difficulty Level:** [Easy, Medium, Hard]
+
+**STEPS:**
+1. [Alternative approach steps]
+2. [Different method to try]
+3. [Continue with alternative process]
+
+**WHEN THIS IS BETTER:** [Explain when to use this instead of primary solution]
+
+---
+
+🔧 **QUICK TEMPORARY FIX** (If immediate solution needed)
+**Temporary Solution:** [Quick workaround]
+**Duration:** [How long this fix will last]
+**Steps:**
+1. [Quick fix steps]
+2. [Temporary measures]
+
+**NOTE:** [Explain this is temporary and permanent fix still needed]
+
+---
+
+🚨 **WHEN TO CALL PROFESSIONAL SERVICE IMMEDIATELY:**
+• [Specific dangerous conditions]
+• [Signs of complex electrical/refrigerant issues]
+• [Warranty concerns - don't void warranty]
+• [If multiple attempts have failed]
+• [If special tools/expertise required]
+
+**PROFESSIONAL SERVICE CONTACT:**
+• Manufacturer warranty service: [When to use]
+• Local appliance repair: [When to use]
+• Emergency service: [When urgent]
+
+---
+
+💡 **COST ANALYSIS:**
+**DIY Repair Costs:**
+• Parts: $[estimate range]
+• Tools (if needed): $[estimate range]
+• Total DIY Cost: $[total range]
+
+**Professional Repair Costs:**
+• Service Call: $[typical range]
+• Labor: $[estimate range]  
+• Parts: $[estimate range]
+• Total Professional Cost: $[total range]
+
+**ROI Analysis:** [When DIY vs professional makes financial sense]
+
+---
+
+🛡️ **PREVENTION & MAINTENANCE:**
+**To Prevent This Problem:**
+• [Specific maintenance tasks with frequency]
+• [What to monitor regularly]
+• [Signs to watch for]
+
+**Regular Maintenance Schedule:**
+• Monthly: [Tasks]
+• Quarterly: [Tasks]
+• Annually: [Tasks]
+
+**RED FLAGS - Call Professional If You See:**
+• [Warning signs that indicate bigger problems]
+• [Symptoms that suggest professional help needed]
+"""
+
+_DIAGNOSIS_PROMPT_TMPL = """
+You are a master refrigerator technician with 25+ years of experience diagnosing and repairing all major refrigerator brands (Samsung, LG, Whirlpool, GE, Frigidaire, KitchenAid, Bosch, etc.). 
+
+**ANALYSIS CONTEXT:**
+- Problem Description from Video: {user_description}
+- Video File: {google_file_name}
+- Task: Provide comprehensive refrigerator analysis and diagnosis
+
+**INSTRUCTIONS:** Analyze both visual and audio elements carefully. Look for brand logos, model numbers, refrigerator layout, problem descriptions, any sounds/noises, and visible issues.
+
+**AUDIO ANALYSIS SUMMARY:** {audio_summary}
+
+Provide your expert analysis in this EXACT format:
+
+🏠 **REFRIGERATOR IDENTIFICATION & FEATURES:**
+Brand: [Identify brand from logos, design, or state "Unable to determine"]
+Model Number: [Look for model stickers/plates or state "Not visible in video"]
+Refrigerator Type: [Top Freezer, Bottom Freezer, Side-by-Side, French Door, Compact, Built-in]
+Estimated Age: [Based on design, features, condition: "1-2 years", "3-5 years", "5-10 years", "10+ years"]
+Estimated Capacity: [Based on size: "10-15 cu ft", "16-20 cu ft", "21-25 cu ft", "26+ cu ft", or "Compact <10 cu ft"]
+
+Key Features Observed:
+• Ice Maker: [Present/Not Present/Not Visible] - [Type: In-door, Freezer compartment, External dispenser]
+• Water Dispenser: [Present/Not Present/Not Visible] - [Internal/External]
+• Display Panel: [Digital/Manual/None visible] - [Working/Not working/Not clear]
+• Door Configuration: [Single/Double/Triple door layout]
+• Special Features: [List any visible: LED lighting, drawers, shelves, temperature zones, etc.]
+
+❄️ **DETAILED PROBLEM ANALYSIS:**
+Primary Issue Category: [Ice Making Problems, Cooling/Temperature Issues, Water Dispenser Issues, Strange Noises/Sounds, Door Problems, Electrical Issues, Leaking/Water Issues, Other]
+
+Severity Assessment: [Simple DIY Fix, Moderate Repair, Complex Professional Repair]
+
+**PROBLEM STATEMENT:**
+[Write a clear, comprehensive description of the exact problem based on video evidence and user description]
+
+**SYMPTOMS OBSERVED:**
+• Visual Symptoms: [List everything you see wrong in the video]
+• Audio Symptoms: [List any sounds, noises, or spoken problems]
+• Reported Symptoms: [Summarize what was described in the video]
+
+**ROOT CAUSE ANALYSIS:**
+Most Likely Causes (in order of probability):
+1. [Primary cause with technical explanation]
+2. [Secondary cause with explanation]  
+3. [Tertiary cause with explanation]
+
+**TECHNICAL DIAGNOSIS:**
+[Provide technical explanation of why this problem occurs, which components are involved]
+
+🔧 **COMPREHENSIVE SOLUTIONS:**
+[Provide detailed solutions based on severity level]
+
+⚠️ **SAFETY WARNINGS & PROFESSIONAL RECOMMENDATIONS:**
+**SAFETY FIRST:**
+• [List all safety precautions before attempting any fixes]
+• [Electrical safety warnings if applicable]
+• [When to disconnect power/water]
+
+**CALL PROFESSIONAL SERVICE IF:**
+• [Specific conditions requiring professional help]
+• [Signs that indicate complex electrical/refrigerant issues]
+• [Warranty considerations]
+
+**ESTIMATED COST:**
+• DIY Repair: [Cost range for parts/supplies]
+• Professional Repair: [Estimated service cost range]
+
+**PREVENTION TIPS:**
+[How to prevent this problem in the future]
+"""
+
 class GoogleFilesProcessor:
     def __init__(self):
+        # One HTTP session (and TLS connection pool) shared by all Files API calls
+        self._session: Optional["aiohttp.ClientSession"] = None
+        self._session_lock = asyncio.Lock() if HTTP_CLIENT_AVAILABLE else None
+        
         # Check if Google AI is available
         if not GOOGLE_AI_AVAILABLE:
             logger.error("Google Generative AI is not available")
@@ -93,116 +515,75 @@ class GoogleFilesProcessor:
                 HTTP_CLIENT_AVAILABLE and 
                 self.api_key is not None)
 
+    async def _get_session(self) -> "aiohttp.ClientSession":
+        """Return the shared HTTP session, creating it on first use"""
+        if self._session is None or self._session.closed:
+            async with self._session_lock:
+                if self._session is None or self._session.closed:
+                    ssl_context = get_ssl_context()
+                    if ssl_context is None:
+                        raise Exception("Failed to create SSL context")
+                    connector = aiohttp.TCPConnector(
+                        ssl=ssl_context,
+                        limit=100,
+                        limit_per_host=30,
+                        keepalive_timeout=75,
+                        enable_cleanup_closed=True
+                    )
+                    self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def close(self) -> None:
+        """Close the shared HTTP session"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
     def clean_model_output(self, text: str) -> str:
         """Clean model outputs to remove meta-commentary"""
         if not text:
             return ""
+        head = text[:32].casefold()
+        if not head.startswith(_CLEANUP_PREFIXES):
+            return text.strip()
             
-        import re
-        text = re.sub(r'^(Okay|Here\'?s?( is)?|Let me|I will|I\'ll|I can|I would|I am going to|Allow me to|Sure|Of course|Certainly|Alright).*?,\s*', '', text, flags=re.IGNORECASE)
-        text = re.sub(r'^(Here\'?s?( is)?|I\'?ll?|Let me|I will|I can|I would|I am going to|Allow me to|Sure|Of course|Certainly).*?(summary|translate|breakdown|analysis).*?:\s*', '', text, flags=re.IGNORECASE)
-        text = re.sub(r'^(Based on|According to).*?,\s*', '', text, flags=re.IGNORECASE)
-        text = re.sub(r'^I understand.*?[.!]\s*', '', text, flags=re.IGNORECASE)
-        text = re.sub(r'^(Now|First|Let\'s),?\s*', '', text, flags=re.IGNORECASE)
-        text = re.sub(r'^(Here are|The following is|This is|Below is).*?:\s*', '', text, flags=re.IGNORECASE)
-        text = re.sub(r'^(I\'ll provide|Let me break|I\'ll break|I\'ll help|I\'ve structured).*?:\s*', '', text, flags=re.IGNORECASE)
-        text = re.sub(r'^(As requested|Following your|In response to).*?:\s*', '', text, flags=re.IGNORECASE)
+        for prefixes, pattern in _CLEANUP_RULES:
+            if head.startswith(prefixes):
+                cleaned = pattern.sub('', text, count=1)
+                if len(cleaned) != len(text):
+                    text = cleaned
+                    head = text[:32].casefold()
         return text.strip()
 
     def parse_refrigerator_fields(self, diagnosis_text: str) -> Dict[str, str]:
         """Extract structured fields from diagnosis text"""
-        import re
-        
         # Initialize with defaults
-        fields = {
-            'brand': 'Unable to determine',
-            'model': 'Unable to determine', 
-            'refrigerator_type': 'Standard',
-            'issue_category': 'General Issue',
-            'severity_level': 'Moderate'
-        }
+        fields = dict(_FIELD_DEFAULTS)
         
         if not diagnosis_text:
             return fields
         
         try:
-            # Extract Brand (multiple patterns)
-            brand_patterns = [
-                r'Brand:\s*\[([^\]]+)\]',
-                r'Brand:\s*([^\n\[]+?)(?:\s*\[|$|\n)',
-                r'Brand:\s*([^\n]+)',
-                r'Brand\s*:\s*([^\n]+)'
-            ]
-            for pattern in brand_patterns:
-                brand_match = re.search(pattern, diagnosis_text, re.IGNORECASE)
-                if brand_match:
-                    brand_value = brand_match.group(1).strip()
-                    if brand_value and brand_value.lower() not in ['unable to determine', 'not visible', 'unknown']:
-                        fields['brand'] = brand_value
-                        break
+            # Walk the "Label: value" lines once, keeping the first usable value per field
+            found = set()
+            for line in diagnosis_text.splitlines():
+                label, colon, value = line.partition(':')
+                if not colon:
+                    continue
+                field = _FIELD_LABELS.get(' '.join(label.strip(_LABEL_DECORATION).lower().split()))
+                if field is None or field in found:
+                    continue
                 
-            # Extract Model (multiple patterns)
-            model_patterns = [
-                r'Model Number:\s*\[([^\]]+)\]',
-                r'Model Number:\s*([^\n\[]+?)(?:\s*\[|$|\n)',
-                r'Model Number:\s*([^\n]+)',
-                r'Model\s*Number\s*:\s*([^\n]+)',
-                r'Model:\s*([^\n]+)'
-            ]
-            for pattern in model_patterns:
-                model_match = re.search(pattern, diagnosis_text, re.IGNORECASE)
-                if model_match:
-                    model_value = model_match.group(1).strip()
-                    if model_value and model_value.lower() not in ['unable to determine', 'not visible', 'unknown', 'not visible in video']:
-                        fields['model'] = model_value
-                        break
-                
-            # Extract Refrigerator Type (multiple patterns)
-            type_patterns = [
-                r'Refrigerator Type:\s*\[([^\]]+)\]',
-                r'Refrigerator Type:\s*([^\n\[]+?)(?:\s*\[|$|\n)',
-                r'Refrigerator Type:\s*([^\n]+)',
-                r'Type:\s*([^\n]+)'
-            ]
-            for pattern in type_patterns:
-                type_match = re.search(pattern, diagnosis_text, re.IGNORECASE)
-                if type_match:
-                    type_value = type_match.group(1).strip()
-                    if type_value:
-                        fields['refrigerator_type'] = type_value
-                        break
-                
-            # Extract Issue Category (multiple patterns)
-            category_patterns = [
-                r'Primary Issue Category:\s*\[([^\]]+)\]',
-                r'Primary Issue Category:\s*([^\n\[]+?)(?:\s*\[|$|\n)',
-                r'Primary Issue Category:\s*([^\n]+)',
-                r'Issue Category:\s*([^\n]+)',
-                r'Problem Category:\s*([^\n]+)'
-            ]
-            for pattern in category_patterns:
-                category_match = re.search(pattern, diagnosis_text, re.IGNORECASE)
-                if category_match:
-                    category_value = category_match.group(1).strip()
-                    if category_value:
-                        fields['issue_category'] = category_value
-                        break
-                
-            # Extract Severity Level (multiple patterns)
-            severity_patterns = [
-                r'Severity Assessment:\s*\[([^\]]+)\]',
-                r'Severity Assessment:\s*([^\n\[]+?)(?:\s*\[|$|\n)',
-                r'Severity Assessment:\s*([^\n]+)',
-                r'Severity:\s*([^\n]+)',
-                r'Difficulty:\s*([^\n]+)'
-            ]
-            for pattern in severity_patterns:
-                severity_match = re.search(pattern, diagnosis_text, re.IGNORECASE)
-                if severity_match:
-                    severity_value = severity_match.group(1).strip()
-                    if severity_value:
-                        fields['severity_level'] = severity_value
-                        break
+                value = value.strip(_LABEL_DECORATION)
+                if value.startswith('[') and ']' in value:
+                    value = value[1:value.index(']')]
+                else:
+                    # Drop a trailing [note] after a plain value
+                    value = value.split('[', 1)[0].strip() or value
+                value = value.strip()
+                if value and value.lower() not in _FIELD_EXCLUDED_VALUES.get(field, ()):
+                    fields[field] = value
+                    found.add(field)
                 
             # Log extracted values for debugging
             logger.info(f'Parsed refrigerator fields: {fields}')
@@ -212,92 +593,112 @@ class GoogleFilesProcessor:
             
         return fields
 
-    async def upload_to_google_files(self, file_buffer: bytes, file_name: str, mime_type: str) -> GoogleFileUploadResult:
-        """Upload file to Google Files API using resumable upload"""
+    @asynccontextmanager
+    async def open_resumable_upload(self, file_name: str, mime_type: str, size: int) -> AsyncIterator["GoogleResumableUpload"]:
+        """Start a resumable upload session that file data can be sent to in chunks"""
         if not self.is_available():
             raise Exception("Google Files Processor is not properly configured. Check environment variables and dependencies.")
             
         logger.info(f"Uploading file to Google Files API: {file_name}")
 
-        try:
-            # Step 1: Initiate resumable upload
-            metadata = {
-                "file": {
-                    "display_name": file_name,
-                },
-            }
-
-            logger.info("Starting resumable upload session", {
-                "fileName": file_name,
-                "fileSize": len(file_buffer),
-                "mimeType": mime_type
-            })
+        # Step 1: Initiate resumable upload
+        metadata = {
+            "file": {
+                "display_name": file_name,
+            },
+        }
 
-            # Create SSL context and connector
-            ssl_context = create_ssl_context()
-            if ssl_context is None:
-                raise Exception("Failed to create SSL context")
-                
-            connector = aiohttp.TCPConnector(ssl=ssl_context)
-            
-            async with aiohttp.ClientSession(connector=connector) as session:
-                # Step 1: Initiate upload
-                init_url = f"https://generativelanguage.googleapis.com/upload/v1beta/files?key={self.api_key}"
-                init_headers = {
-                    'X-Goog-Upload-Protocol': 'resumable',
-                    'X-Goog-Upload-Command': 'start',
-                    'X-Goog-Upload-Header-Content-Length': str(len(file_buffer)),
-                    'X-Goog-Upload-Header-Content-Type': mime_type,
-                    'Content-Type': 'application/json',
-                }
-
-                async with session.post(init_url, headers=init_headers, json=metadata) as init_response:
-                    if not init_response.ok:
-                        error_text = await init_response.text()
-                        logger.error('Failed to initiate resumable upload', {
-                            'status': init_response.status,
-                            'error': error_text
-                        })
-                        raise Exception(f"Failed to initiate upload: {init_response.status} - {error_text}")
-
-                    # Step 2: Get upload URL from response headers
-                    upload_url = init_response.headers.get('x-goog-upload-url')
-                    if not upload_url:
-                        raise Exception('No upload URL received from Google Files API')
-
-                    logger.info('Upload session initiated, uploading file data', {'uploadUrl': upload_url})
-
-                # Step 3: Upload the actual file data
-                upload_headers = {
-                    'Content-Length': str(len(file_buffer)),
-                    'X-Goog-Upload-Offset': '0',
-                    'X-Goog-Upload-Command': 'upload, finalize',
-                }
-
-                async with session.post(upload_url, headers=upload_headers, data=file_buffer) as upload_response:
-                    if not upload_response.ok:
-                        error_text = await upload_response.text()
-                        logger.error('Failed to upload file data', {
-                            'status': upload_response.status,
-                            'error': error_text
-                        })
-                        raise Exception(f"Failed to upload file data: {upload_response.status} - {error_text}")
-
-                    result = await upload_response.json()
-                    logger.info('File uploaded successfully to Google Files API', result)
-
-                    # Check if the response has the expected structure
-                    if not result.get('file') or not result['file'].get('name') or not result['file'].get('uri'):
-                        logger.error('Unexpected upload response format', result)
-                        raise Exception('Google Files API returned unexpected response format')
-
-                    return GoogleFileUploadResult(
-                        file_uri=result['file']['uri'],
-                        name=result['file']['name'],
-                        mime_type=result['file']['mimeType'],
-                        size_bytes=result['file']['sizeBytes'],
-                        state=result['file']['state'],
-                    )
+        logger.info("Starting resumable upload session", {
+            "fileName": file_name,
+            "fileSize": size,
+            "mimeType": mime_type
+        })
+
+        session = await self._get_session()
+        init_url = f"https://generativelanguage.googleapis.com/upload/v1beta/files?key={self.api_key}"
+        init_headers = {
+            'X-Goog-Upload-Protocol': 'resumable',
+            'X-Goog-Upload-Command': 'start',
+            'X-Goog-Upload-Header-Content-Length': str(size),
+            'X-Goog-Upload-Header-Content-Type': mime_type,
+            'Content-Type': 'application/json',
+        }
+
+        async with session.post(init_url, headers=init_headers, json=metadata) as init_response:
+            if not init_response.ok:
+                error_text = await init_response.text()
+                logger.error('Failed to initiate resumable upload', {
+                    'status': init_response.status,
+                    'error': error_text
+                })
+                raise Exception(f"Failed to initiate upload: {init_response.status} - {error_text}")
+
+            # Step 2: Get upload URL from response headers
+            upload_url = init_response.headers.get('x-goog-upload-url')
+            if not upload_url:
+                raise Exception('No upload URL received from Google Files API')
+
+            logger.info('Upload session initiated, uploading file data', {'uploadUrl': upload_url})
+
+        # Step 3: Caller sends the file data through the session
+        yield GoogleResumableUpload(session, upload_url, size)
+
+    async def upload_small_file(self, file_data: bytes, file_name: str, mime_type: str) -> GoogleFileUploadResult:
+        """Upload a small file with a single multipart request"""
+        if not self.is_available():
+            raise Exception("Google Files Processor is not properly configured. Check environment variables and dependencies.")
+
+        logger.info("Uploading file in a single request", {
+            "fileName": file_name,
+            "fileSize": len(file_data),
+            "mimeType": mime_type
+        })
+
+        with aiohttp.MultipartWriter('related') as body:
+            body.append_json({"file": {"display_name": file_name}})
+            body.append(file_data, {'Content-Type': mime_type})
+
+        session = await self._get_session()
+        url = f"https://generativelanguage.googleapis.com/upload/v1beta/files?uploadType=multipart&key={self.api_key}"
+        headers = {'X-Goog-Upload-Protocol': 'multipart'}
+
+        async with session.post(url, headers=headers, data=body) as response:
+            if not response.ok:
+                error_text = await response.text()
+                logger.error('Failed to upload file', {
+                    'status': response.status,
+                    'error': error_text
+                })
+                raise Exception(f"Failed to upload file: {response.status} - {error_text}")
+
+            result = await response.json()
+            return _upload_result(result, hashlib.sha256(file_data).hexdigest())
+
+    async def upload_to_google_files(self, file_data: Union[bytes, AsyncIterator[bytes]], file_name: str, mime_type: str, size: Optional[int] = None) -> GoogleFileUploadResult:
+        """Upload file to Google Files API, from bytes or a stream of chunks"""
+        try:
+            if isinstance(file_data, (bytes, bytearray)) and len(file_data) < SINGLE_REQUEST_UPLOAD_LIMIT:
+                return await self.upload_small_file(bytes(file_data), file_name, mime_type)
+
+            if isinstance(file_data, (bytes, bytearray)):
+                async with self.open_resumable_upload(file_name, mime_type, len(file_data)) as upload:
+                    return await upload.send(file_data)
+
+            # Stream the data so memory stays at one chunk regardless of file size
+            if size is None:
+                raise Exception('File size is required when uploading from a stream')
+            if size < SINGLE_REQUEST_UPLOAD_LIMIT:
+                data = bytearray()
+                async for chunk in file_data:
+                    data += chunk
+                return await self.upload_small_file(bytes(data), file_name, mime_type)
+            result = None
+            async with self.open_resumable_upload(file_name, mime_type, size) as upload:
+                async for chunk in _aligned_chunks(file_data, UPLOAD_CHUNK_SIZE):
+                    result = await upload.send(chunk)
+            if result is None:
+                raise Exception('Upload stream ended before the whole file was sent')
+            return result
         except Exception as e:
             logger.error(f'Failed to upload to Google Files API: {str(e)}')
             raise Exception(f"Failed to upload to Google Files API: {str(e)}")
@@ -307,284 +708,219 @@ class GoogleFilesProcessor:
         logger.info(f"Waiting for file processing: {file_name}")
 
         start_time = asyncio.get_event_loop().time()
-        poll_interval = 5  # 5 seconds
+        # Back off from 0.5s to a 5s cap so short videos are picked up quickly
+        poll_interval = 0.5
 
         while (asyncio.get_event_loop().time() - start_time) * 1000 < max_wait_time:
             try:
-                # Create SSL context and connector
-                ssl_context = create_ssl_context()
-                connector = aiohttp.TCPConnector(ssl=ssl_context)
-                
-                async with aiohttp.ClientSession(connector=connector) as session:
-                    url = f"https://generativelanguage.googleapis.com/v1beta/{file_name}?key={self.api_key}"
-                    async with session.get(url) as response:
-                        if not response.ok:
-                            error_text = await response.text()
-                            logger.error('Failed to check file status', {
-                                'status': response.status,
-                                'statusText': response.reason,
-                                'error': error_text
-                            })
-                            raise Exception(f"Failed to check file status: {response.status} - {error_text}")
-
-                        file_info = await response.json()
-                        logger.info('File processing status', {
-                            'state': file_info.get('state'),
-                            'name': file_info.get('name'),
-                            'mimeType': file_info.get('mimeType')
+                session = await self._get_session()
+                url = f"https://generativelanguage.googleapis.com/v1beta/{file_name}?key={self.api_key}"
+                async with session.get(url) as response:
+                    if not response.ok:
+                        error_text = await response.text()
+                        logger.error('Failed to check file status', {
+                            'status': response.status,
+                            'statusText': response.reason,
+                            'error': error_text
                         })
-
-                        if file_info.get('state') == 'ACTIVE':
-                            logger.info('File processing completed successfully')
-                            return True
-                        elif file_info.get('state') == 'FAILED':
-                            raise Exception('File processing failed on Google servers')
-
-                        logger.info(f"File state: {file_info.get('state')}, waiting {poll_interval}s before next check...")
-
-                        # Wait before next poll
-                        await asyncio.sleep(poll_interval)
+                        raise Exception(f"Failed to check file status: {response.status} - {error_text}")
+
+                    file_info = await response.json()
+                    logger.info('File processing status', {
+                        'state': file_info.get('state'),
+                        'name': file_info.get('name'),
+                        'mimeType': file_info.get('mimeType')
+                    })
+
+                    if file_info.get('state') == 'ACTIVE':
+                        logger.info('File processing completed successfully')
+                        return True
+                    elif file_info.get('state') == 'FAILED':
+                        raise Exception('File processing failed on Google servers')
+
+                    logger.info(f"File state: {file_info.get('state')}, waiting {poll_interval:.1f}s before next check...")
+
+                    # Wait before next poll, with jitter so concurrent uploads don't poll in lockstep
+                    await asyncio.sleep(poll_interval + random.uniform(0, poll_interval * 0.2))
+                    poll_interval = min(poll_interval * 1.8, 5.0)
             except Exception as e:
                 logger.error(f'Error checking file processing status: {str(e)}')
                 raise e
 
         raise Exception(f"File processing timeout after {max_wait_time / 1000} seconds")
 
-    async def process_refrigerator_video(self, file_uri: str, google_file_name: str, mime_type: str, user_description: Optional[str] = None) -> RefrigeratorDiagnosisResult:
+    def get_cached_diagnosis(self, file_sha256: Optional[str], user_description: Optional[str] = None) -> Optional[RefrigeratorDiagnosisResult]:
+        """Return the diagnosis from cached Gemini responses if all three are cached"""
+        description = user_description or ''
+        audio_summary = _cached_response(file_sha256, 'audio')
+        if audio_summary is None:
+            return None
+        audio_context = self._audio_summary_context(audio_summary, complete=True)
+        diagnosis_text = _cached_response(file_sha256, 'diagnosis', description, audio_context)
+        solutions_text = _cached_response(file_sha256, 'solutions', description)
+        if diagnosis_text is None or solutions_text is None:
+            return None
+        logger.info('Using cached Gemini responses for video', {'sha256': file_sha256})
+        return self._build_diagnosis_result(audio_summary, diagnosis_text, solutions_text)
+
+    def _audio_summary_context(self, audio_text: str, complete: bool = False) -> Optional[str]:
+        """Return the first paragraph of a possibly partial audio summary, once it is complete"""
+        text = self.clean_model_output(audio_text)
+        end = text.find('\n\n')
+        if end != -1:
+            return text[:end].rstrip()
+        # A blank line at the very end also closes the first paragraph
+        if complete or (text and audio_text.rstrip(' \t').endswith('\n\n')):
+            return text
+        return None
+
+    def _build_diagnosis_result(self, audio_summary: str, diagnosis_text: str, solutions_text: str) -> RefrigeratorDiagnosisResult:
+        """Clean the raw model responses and parse the structured fields"""
+        # Clean the response text
+        diagnosis_content = self.clean_model_output(diagnosis_text)
+        solutions_content = self.clean_model_output(solutions_text)
+        audio_summary_clean = self.clean_model_output(audio_summary)
+
+        # Parse structured fields from diagnosis
+        parsed_fields = self.parse_refrigerator_fields(diagnosis_content)
+
+        return RefrigeratorDiagnosisResult(
+            audio_summary=audio_summary_clean,
+            diagnosis_result=diagnosis_content,
+            solutions=solutions_content,
+            brand=parsed_fields['brand'],
+            model=parsed_fields['model'],
+            refrigerator_type=parsed_fields['refrigerator_type'],
+            issue_category=parsed_fields['issue_category'],
+            severity_level=parsed_fields['severity_level']
+        )
+
+    async def process_refrigerator_video(self, file_uri: str, google_file_name: str, mime_type: str, user_description: Optional[str] = None, file_sha256: Optional[str] = None) -> RefrigeratorDiagnosisResult:
         """Diagnose refrigerator issues using Gemini"""
         logger.info(f"Diagnosing refrigerator video with Gemini: {google_file_name}")
 
+        solutions_task: Optional[asyncio.Task] = None
+        diagnosis_task: Optional[asyncio.Task] = None
         try:
-            model = genai.GenerativeModel("gemini-2.0-flash-001")
-
-            # Get the file object first
-            file_obj = genai.get_file(google_file_name)
+            model = genai.GenerativeModel(DIAGNOSIS_MODEL_NAME)
+            description = user_description or ''
+
+            # The file object is fetched once, and only if some response is not cached
+            file_obj_task: Optional[asyncio.Future] = None
+
+            async def get_file_obj():
+                nonlocal file_obj_task
+                if file_obj_task is None:
+                    file_obj_task = asyncio.ensure_future(asyncio.to_thread(genai.get_file, google_file_name))
+                return await file_obj_task
+
+            def cache_response(text: str, *cache_parts: str) -> None:
+                if _response_cache is not None and file_sha256:
+                    _response_cache.put(_response_cache_key(file_sha256, *cache_parts), text, model=DIAGNOSIS_MODEL_NAME, promptVersion=PROMPT_VERSION)
+
+            async def generate(prompt: str, *cache_parts: str) -> str:
+                cached = _cached_response(file_sha256, *cache_parts)
+                if cached is not None:
+                    return cached
+                file_obj = await get_file_obj()
+                # generate_content is blocking, so run it off the event loop
+                response = await asyncio.to_thread(model.generate_content, [
+                    file_obj,
+                    prompt
+                ])
+                text = response.text.strip()
+                cache_response(text, *cache_parts)
+                return text
+
+            async def stream_generate(prompt: str, *cache_parts: str) -> AsyncIterator[str]:
+                cached = _cached_response(file_sha256, *cache_parts)
+                if cached is not None:
+                    yield cached
+                    return
+                file_obj = await get_file_obj()
+                # The streamed response is iterated on a worker thread and handed
+                # back to the event loop piece by piece
+                loop = asyncio.get_running_loop()
+                queue: asyncio.Queue = asyncio.Queue()
+                # Set when the consumer stops early, so the thread stops pulling from Gemini
+                stop = threading.Event()
+
+                def produce() -> None:
+                    try:
+                        for chunk in model.generate_content([file_obj, prompt], stream=True):
+                            if stop.is_set():
+                                break
+                            text = _chunk_text(chunk)
+                            if text:
+                                loop.call_soon_threadsafe(queue.put_nowait, text)
+                    except Exception as e:
+                        loop.call_soon_threadsafe(queue.put_nowait, e)
+                    else:
+                        loop.call_soon_threadsafe(queue.put_nowait, None)
+
+                producer = asyncio.ensure_future(asyncio.to_thread(produce))
+                pieces = []
+                try:
+                    while True:
+                        piece = await queue.get()
+                        if piece is None:
+                            break
+                        if isinstance(piece, Exception):
+                            raise piece
+                        pieces.append(piece)
+                        yield piece
+                finally:
+                    stop.set()
+                await producer
+                cache_response(''.join(pieces).strip(), *cache_parts)
 
             # Extract key problem information from audio (no detailed transcript)
-            audio_analysis_prompt = """
-            Analyze the audio content of this refrigerator video and extract only the key problem information:
-
-            **EXTRACT ONLY:**
-            - Main refrigerator problem described
-            - Any error codes or display messages mentioned
-            - Specific symptoms mentioned (sounds, temperatures, functions not working)
-            - Brand/model information if mentioned
-            - Any previous troubleshooting attempts mentioned
-
-            **FORMAT:** Provide a brief summary (2-3 sentences) of the key problem information from the audio.
-            **DO NOT:** Provide timestamps or detailed transcription.
-            """
-
-            audio_response = model.generate_content([
-                file_obj,
-                audio_analysis_prompt
-            ])
-
-            audio_summary = audio_response.text.strip()
-
-            # Then create the refrigerator diagnosis
-            diagnosis_prompt = f"""
-            You are a master refrigerator technician with 25+ years of experience diagnosing and repairing all major refrigerator brands (Samsung, LG, Whirlpool, GE, Frigidaire, KitchenAid, Bosch, etc.). 
-
-            **ANALYSIS CONTEXT:**
-            - Problem Description from Video: {user_description if user_description else "No specific problem description provided"}
-            - Video File: {google_file_name}
-            - Task: Provide comprehensive refrigerator analysis and diagnosis
-
-            **INSTRUCTIONS:** Analyze both visual and audio elements carefully. Look for brand logos, model numbers, refrigerator layout, problem descriptions, any sounds/noises, and visible issues.
+            audio_analysis_prompt = _AUDIO_ANALYSIS_PROMPT
 
-            **AUDIO ANALYSIS SUMMARY:** {audio_summary}
-
-            Provide your expert analysis in this EXACT format:
-
-            🏠 **REFRIGERATOR IDENTIFICATION & FEATURES:**
-            Brand: [Identify brand from logos, design, or state "Unable to determine"]
-            Model Number: [Look for model stickers/plates or state "Not visible in video"]
-            Refrigerator Type: [Top Freezer, Bottom Freezer, Side-by-Side, French Door, Compact, Built-in]
-            Estimated Age: [Based on design, features, condition: "1-2 years", "3-5 years", "5-10 years", "10+ years"]
-            Estimated Capacity: [Based on size: "10-15 cu ft", "16-20 cu ft", "21-25 cu ft", "26+ cu ft", or "Compact <10 cu ft"]
-            
-            Key Features Observed:
-            • Ice Maker: [Present/Not Present/Not Visible] - [Type: In-door, Freezer compartment, External dispenser]
-            • Water Dispenser: [Present/Not Present/Not Visible] - [Internal/External]
-            • Display Panel: [Digital/Manual/None visible] - [Working/Not working/Not clear]
-            • Door Configuration: [Single/Double/Triple door layout]
-            • Special Features: [List any visible: LED lighting, drawers, shelves, temperature zones, etc.]
-
-            ❄️ **DETAILED PROBLEM ANALYSIS:**
-            Primary Issue Category: [Ice Making Problems, Cooling/Temperature Issues, Water Dispenser Issues, Strange Noises/Sounds, Door Problems, Electrical Issues, Leaking/Water Issues, Other]
-            
-            Severity Assessment: [Simple DIY Fix, Moderate Repair, Complex Professional Repair]
-            
-            **PROBLEM STATEMENT:**
-            [Write a clear, comprehensive description of the exact problem based on video evidence and user description]
-            
-            **SYMPTOMS OBSERVED:**
-            • Visual Symptoms: [List everything you see wrong in the video]
-            • Audio Symptoms: [List any sounds, noises, or spoken problems]
-            • Reported Symptoms: [Summarize what was described in the video]
-            
-            **ROOT CAUSE ANALYSIS:**
-            Most Likely Causes (in order of probability):
-            1. [Primary cause with technical explanation]
-            2. [Secondary cause with explanation]  
-            3. [Tertiary cause with explanation]
-            
-            **TECHNICAL DIAGNOSIS:**
-            [Provide technical explanation of why this problem occurs, which components are involved]
-
-            🔧 **COMPREHENSIVE SOLUTIONS:**
-            [Provide detailed solutions based on severity level]
+            # Solutions only depend on the user description
+            solutions_prompt = _SOLUTIONS_PROMPT_TMPL.format_map({
+                'user_description': user_description or "Refrigerator issue from video analysis"
+            })
 
-            ⚠️ **SAFETY WARNINGS & PROFESSIONAL RECOMMENDATIONS:**
-            **SAFETY FIRST:**
-            • [List all safety precautions before attempting any fixes]
-            • [Electrical safety warnings if applicable]
-            • [When to disconnect power/water]
-            
-            **CALL PROFESSIONAL SERVICE IF:**
-            • [Specific conditions requiring professional help]
-            • [Signs that indicate complex electrical/refrigerant issues]
-            • [Warranty considerations]
-            
-            **ESTIMATED COST:**
-            • DIY Repair: [Cost range for parts/supplies]
-            • Professional Repair: [Estimated service cost range]
-            
-            **PREVENTION TIPS:**
-            [How to prevent this problem in the future]
-            """
+            # Solutions run alongside the audio summary and diagnosis, which
+            # has to wait for the audio summary
+            solutions_task = asyncio.create_task(generate(solutions_prompt, 'solutions', description))
+
+            # The refrigerator diagnosis is built around the audio summary
+            def build_diagnosis_prompt(audio_summary: str) -> str:
+                return _DIAGNOSIS_PROMPT_TMPL.format_map({
+                    'user_description': user_description or "No specific problem description provided",
+                    'google_file_name': google_file_name,
+                    'audio_summary': audio_summary
+                })
+
+            def start_diagnosis(audio_context: str) -> asyncio.Task:
+                return asyncio.create_task(generate(
+                    build_diagnosis_prompt(audio_context), 'diagnosis', description, audio_context
+                ))
+
+            # Stream the audio summary so the diagnosis can start as soon as its
+            # first paragraph is complete instead of after the whole response
+            audio_text = ''
+            audio_stream = stream_generate(audio_analysis_prompt, 'audio')
+            try:
+                async for piece in audio_stream:
+                    audio_text += piece
+                    if diagnosis_task is None:
+                        audio_context = self._audio_summary_context(audio_text)
+                        if audio_context is not None:
+                            diagnosis_task = start_diagnosis(audio_context)
+            finally:
+                # Stops the producer thread right away if this task fails or is cancelled
+                await audio_stream.aclose()
+            audio_summary = audio_text.strip()
+            if diagnosis_task is None:
+                diagnosis_task = start_diagnosis(self._audio_summary_context(audio_summary, complete=True))
 
             # Process the refrigerator video
-            diagnosis_response = model.generate_content([
-                file_obj,
-                diagnosis_prompt
-            ])
-
-            diagnosis_text = diagnosis_response.text.strip()
-
-            # Extract solutions from diagnosis  
-            solutions_prompt = f"""
-            Based on the refrigerator problem analysis, provide comprehensive step-by-step solutions. You are providing expert repair guidance.
-
-            **PROBLEM CONTEXT:** {user_description if user_description else "Refrigerator issue from video analysis"}
-
-            Provide solutions in this EXACT format:
-
-            🔧 **PRIMARY SOLUTION (Recommended)**
-            **Solution Name:** [Clear, descriptive name of the fix]
-            **Solution Type:** [DIY Simple, DIY Moderate, Professional Required]
-            **Time Required:** [Realistic time estimate: "5-10 minutes", "30-45 minutes", "1-2 hours"]
-            **Difficulty Level:** [Easy, Medium, Hard]
-            **Success Rate:** [High, Medium, Low - based on common success of this fix]
-
-            **TOOLS & MATERIALS NEEDED:**
-            • [List specific tools required]
-            • [List any replacement parts needed with part numbers if known]
-            • [List any supplies like cleaning materials, lubricants, etc.]
-
-            **DETAILED STEP-BY-STEP INSTRUCTIONS:**
-            **Preparation:**
-            1. [Safety preparation steps]
-            2. [Power/water disconnection if needed]
-            3. [Access preparation]
-
-            **Main Repair Steps:**
-            1. [Detailed step with specific actions]
-            2. [Include what to look for, how to test]
-            3. [Continue with precise instructions]
-            4. [Include reassembly steps]
-            5. [Testing and verification steps]
-
-            **TROUBLESHOOTING:**
-            • If [specific issue occurs]: [How to resolve]
-            • If problem persists: [Next steps to try]
-
-            **SAFETY WARNINGS:**
-            ⚠️ [List all safety precautions specific to this repair]
-            ⚠️ [Electrical safety if applicable]
-            ⚠️ [When to stop and call professional]
-
-            ---
-
-            🔧 **ALTERNATIVE SOLUTION** (If primary doesn't work)
-            **Solution Name:** [Alternative approach name]
-            **Solution Type:** [DIY Simple, DIY Moderate, Professional Required]
-            **Time Required:** [Time estimate]
-            **Difficulty Level:** [Easy, Medium, Hard]
-
-            **STEPS:**
-            1. [Alternative approach steps]
-            2. [Different method to try]
-            3. [Continue with alternative process]
-
-            **WHEN THIS IS BETTER:** [Explain when to use this instead of primary solution]
-
-            ---
-
-            🔧 **QUICK TEMPORARY FIX** (If immediate solution needed)
-            **Temporary Solution:** [Quick workaround]
-            **Duration:** [How long this fix will last]
-            **Steps:**
-            1. [Quick fix steps]
-            2. [Temporary measures]
-
-            **NOTE:** [Explain this is temporary and permanent fix still needed]
-
-            ---
-
-            🚨 **WHEN TO CALL PROFESSIONAL SERVICE IMMEDIATELY:**
-            • [Specific dangerous conditions]
-            • [Signs of complex electrical/refrigerant issues]
-            • [Warranty concerns - don't void warranty]
-            • [If multiple attempts have failed]
-            • [If special tools/expertise required]
-
-            **PROFESSIONAL SERVICE CONTACT:**
-            • Manufacturer warranty service: [When to use]
-            • Local appliance repair: [When to use]
-            • Emergency service: [When urgent]
-
-            ---
-
-            💡 **COST ANALYSIS:**
-            **DIY Repair Costs:**
-            • Parts: $[estimate range]
-            • Tools (if needed): $[estimate range]
-            • Total DIY Cost: $[total range]
-
-            **Professional Repair Costs:**
-            • Service Call: $[typical range]
-            • Labor: $[estimate range]  
-            • Parts: $[estimate range]
-            • Total Professional Cost: $[total range]
-
-            **ROI Analysis:** [When DIY vs professional makes financial sense]
+            diagnosis_text = await diagnosis_task
 
-            ---
-
-            🛡️ **PREVENTION & MAINTENANCE:**
-            **To Prevent This Problem:**
-            • [Specific maintenance tasks with frequency]
-            • [What to monitor regularly]
-            • [Signs to watch for]
-
-            **Regular Maintenance Schedule:**
-            • Monthly: [Tasks]
-            • Quarterly: [Tasks]
-            • Annually: [Tasks]
-
-            **RED FLAGS - Call Professional If You See:**
-            • [Warning signs that indicate bigger problems]
-            • [Symptoms that suggest professional help needed]
-            """
-
-            solutions_response = model.generate_content([
-                file_obj,
-                solutions_prompt
-            ])
-
-            solutions_text = solutions_response.text.strip()
+            solutions_text = await solutions_task
 
             logger.info('Received refrigerator diagnosis from Gemini', {
                 'diagnosisLength': len(diagnosis_text),
@@ -592,26 +928,12 @@ class GoogleFilesProcessor:
                 'audioSummaryLength': len(audio_summary)
             })
 
-            # Clean the response text
-            diagnosis_content = self.clean_model_output(diagnosis_text)
-            solutions_content = self.clean_model_output(solutions_text)
-            audio_summary_clean = self.clean_model_output(audio_summary)
-
-            # Parse structured fields from diagnosis
-            parsed_fields = self.parse_refrigerator_fields(diagnosis_content)
-
-            return RefrigeratorDiagnosisResult(
-                audio_summary=audio_summary_clean,
-                diagnosis_result=diagnosis_content,
-                solutions=solutions_content,
-                brand=parsed_fields['brand'],
-                model=parsed_fields['model'],
-                refrigerator_type=parsed_fields['refrigerator_type'],
-                issue_category=parsed_fields['issue_category'],
-                severity_level=parsed_fields['severity_level']
-            )
+            return self._build_diagnosis_result(audio_summary, diagnosis_text, solutions_text)
 
         except Exception as e:
+            for task in (solutions_task, diagnosis_task):
+                if task is not None:
+                    task.cancel()
             logger.error(f'Failed to diagnose refrigerator with Gemini: {str(e)}')
             raise Exception(f"Failed to diagnose refrigerator: {str(e)}")
 
@@ -620,25 +942,33 @@ class GoogleFilesProcessor:
         logger.info(f"Deleting Google file: {file_name}")
 
         try:
-            # Create SSL context and connector
-            ssl_context = create_ssl_context()
-            connector = aiohttp.TCPConnector(ssl=ssl_context)
-            
-            async with aiohttp.ClientSession(connector=connector) as session:
-                url = f"https://generativelanguage.googleapis.com/v1beta/{file_name}?key={self.api_key}"
-                async with session.delete(url) as response:
-                    if response.ok:
-                        logger.info('File deleted successfully from Google Files API')
-                    else:
-                        error_text = await response.text()
-                        logger.error('Failed to delete file from Google Files API', {
-                            'status': response.status,
-                            'error': error_text
-                        })
-                        # Don't raise exception for delete failures to avoid breaking the main flow
+            session = await self._get_session()
+            url = f"https://generativelanguage.googleapis.com/v1beta/{file_name}?key={self.api_key}"
+            async with session.delete(url) as response:
+                if response.ok:
+                    logger.info('File deleted successfully from Google Files API')
+                else:
+                    error_text = await response.text()
+                    logger.error('Failed to delete file from Google Files API', {
+                        'status': response.status,
+                        'error': error_text
+                    })
+                    # Don't raise exception for delete failures to avoid breaking the main flow
         except Exception as e:
             logger.error(f'Error deleting file from Google Files API: {str(e)}')
             # Don't raise exception for delete failures
 
-# Create default instance
-google_files_processor = GoogleFilesProcessor() 
\ No newline at end of file
+# Default instance, created on first use rather than at import
+_processor: Optional[GoogleFilesProcessor] = None
+
+def get_google_files_processor() -> GoogleFilesProcessor:
+    """Return the shared processor, creating it on first use"""
+    global _processor
+    if _processor is None:
+        _processor = GoogleFilesProcessor()
+    return _processor
+
+async def close_google_files_processor() -> None:
+    """Close the shared processor if it was ever created"""
+    if _processor is not None:
+        await _processor.close()
@@ -1,6 +1,9 @@
-from supabase import create_client, Client
+from supabase import create_client, Client, ClientOptions
+import httpx
 import os
-from typing import Dict, Any, Optional
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, Optional, TypeVar
 from datetime import datetime
 from dotenv import load_dotenv
 
@@ -11,6 +14,22 @@ load_dotenv()
 supabase_url = os.getenv("NEXT_PUBLIC_SUPABASE_URL")
 supabase_key = os.getenv("NEXT_PUBLIC_SUPABASE_ANON_KEY")
 
+# Connection pool shared by all Supabase queries
+SUPABASE_HTTP_LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=20)
+# Matches supabase-py's default PostgREST timeout, which an injected client replaces
+SUPABASE_HTTP_TIMEOUT = 120
+
+def _client_options() -> ClientOptions:
+    """Client options with a pooled keep-alive HTTP/2 session for the Supabase sub-clients"""
+    # Passed through the supported httpx_client option; each request still
+    # carries the URL, apikey and Authorization headers set by supabase-py
+    return ClientOptions(httpx_client=httpx.Client(
+        timeout=SUPABASE_HTTP_TIMEOUT,
+        limits=SUPABASE_HTTP_LIMITS,
+        follow_redirects=True,
+        http2=True
+    ))
+
 # Initialize Supabase client with error handling
 supabase: Optional[Client] = None
 
@@ -18,7 +37,7 @@ try:
     if supabase_url and supabase_key and not supabase_url.startswith('your_') and not supabase_key.startswith('your_'):
         # Only create client if we have valid-looking URLs and keys
         if supabase_url.startswith('http') and len(supabase_key) > 20:
-            supabase = create_client(supabase_url, supabase_key)
+            supabase = create_client(supabase_url, supabase_key, options=_client_options())
             print("✅ Supabase client initialized successfully")
         else:
             print("⚠️  Supabase configuration appears invalid - client not initialized")
@@ -28,6 +47,16 @@ except Exception as e:
     print(f"⚠️  Failed to initialize Supabase client: {e}")
     supabase = None
 
+# supabase-py is synchronous, so queries run on a bounded thread pool to keep
+# them off the event loop without letting slow queries exhaust the default executor
+_db_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="supabase")
+
+T = TypeVar("T")
+
+async def adb(fn: Callable[[], T]) -> T:
+    """Run a blocking Supabase call on the database thread pool"""
+    return await asyncio.get_running_loop().run_in_executor(_db_pool, fn)
+
 # Database types for TypeScript compatibility
 class Summary:
     def __init__(self, data: Dict[str, Any]):
@@ -1,93 +1,253 @@
 from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request
-from fastapi.responses import StreamingResponse
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, ORJSONResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 import uvicorn
 import os
-import json
+import orjson
 import asyncio
+import importlib
 import logging
-from datetime import datetime
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from starlette.types import ASGIApp, Receive, Scope, Send
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Configure logging first
+from lib.fast_cors import FastCORSMiddleware
+from lib.fast_gzip import StreamingGZipMiddleware
+
+# Deployment environment: "dev" (default) or "prod"
+ENV = os.getenv("ENV", "dev")
+
+class OrjsonFormatter(logging.Formatter):
+    """Format each record as one JSON line, keeping dict arguments as structured data"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {"ts": record.created, "lvl": record.levelname, "name": record.name, "msg": record.getMessage()}
+        if isinstance(record.args, dict):
+            entry["data"] = record.args
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry, default=str).decode()
+
+# Configure logging first; production only emits warnings and errors
+log_handler = logging.StreamHandler()
+log_handler.setFormatter(OrjsonFormatter())
 logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    level=logging.WARNING if ENV == "prod" else logging.INFO,
+    handlers=[log_handler]
 )
 logger = logging.getLogger(__name__)
 
+# libuv event loop for the I/O-bound request handlers (not available on Windows)
+try:
+    import uvloop
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    UVLOOP_AVAILABLE = True
+except ImportError:
+    UVLOOP_AVAILABLE = False
+
+# C HTTP parser, falling back to uvicorn's pure-Python h11
+try:
+    import httptools
+    HTTPTOOLS_AVAILABLE = True
+except ImportError:
+    HTTPTOOLS_AVAILABLE = False
+
+# API routers mounted under /api, as (module, name used in logs)
+ROUTERS = (
+    ("api.process_s3_video", "process_s3_video"),
+    ("api.upload", "upload"),
+    ("api.history", "history"),
+    ("api.chat_router", "chat"),
+)
+
+async def include_routers(app: FastAPI) -> None:
+    """Import the API routers on a worker thread and mount them under /api"""
+    # Imported one at a time: the routers share lib modules and their import locks
+    for module_name, router_name in ROUTERS:
+        try:
+            module = await asyncio.to_thread(importlib.import_module, module_name)
+            app.include_router(module.router, prefix="/api")
+            logger.info(f"Loaded {router_name} router")
+        except Exception as e:
+            logger.error(f"Failed to load {router_name} router: {e}")
+            # Production refuses to start without every router
+            if ENV == "prod":
+                raise
+
+@asynccontextmanager
+async def routers_lifespan(app: FastAPI):
+    # Routers (and the SDK clients they build) load at startup rather than at import
+    await include_routers(app)
+    yield
+
+@asynccontextmanager
+async def s3_lifespan(app: FastAPI):
+    # Warm the shared S3 client's connection pool in the background rather than
+    # on the first video pull. lib.aws_s3 imports nothing from api, so loading
+    # it alongside the routers only waits on its own import lock.
+    try:
+        aws_s3 = await asyncio.to_thread(importlib.import_module, "lib.aws_s3")
+    except Exception as e:
+        logger.error(f"Failed to load S3 client: {e}")
+        # Like the routers, only production refuses to start without it
+        if ENV == "prod":
+            raise
+        yield
+        return
+    aws_s3.s3_upload.preconnect()
+    try:
+        yield
+    finally:
+        aws_s3.s3_upload.close()
+
+@asynccontextmanager
+async def google_files_lifespan(app: FastAPI):
+    try:
+        yield
+    finally:
+        # Close the shared Google Files HTTP session on shutdown
+        from lib.google_files import close_google_files_processor
+        await close_google_files_processor()
+
+# Independent startup/shutdown steps; each owns one resource
+LIFESPANS = (
+    routers_lifespan,
+    s3_lifespan,
+    google_files_lifespan,
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    contexts = [context(app) for context in LIFESPANS]
+    started = set()
+
+    async def start(context) -> None:
+        await context.__aenter__()
+        started.add(context)
+
+    async with AsyncExitStack() as stack:
+        try:
+            # Start every lifespan concurrently; gather waits for all of them even
+            # when one fails, so none is still starting once the stack unwinds
+            results = await asyncio.gather(*(start(context) for context in contexts), return_exceptions=True)
+        finally:
+            # Exits go on the stack in LIFESPANS order, so shutdown runs in reverse
+            # of it whichever lifespan finished starting first
+            for context in contexts:
+                if context in started:
+                    stack.push_async_exit(context)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        yield
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Refrigerator Diagnosis API",
     description="FastAPI backend for refrigerator troubleshooting and diagnosis",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
-# CORS configuration - load from cors-config.json if available
-try:
-    cors_config_path = os.path.join(os.path.dirname(__file__), "cors-config.json")
-    with open(cors_config_path, "r") as f:
-        cors_config = json.load(f)
-        allowed_origins = cors_config.get("allowed_origins", ["*"])
-except FileNotFoundError:
-    allowed_origins = ["*"]
-    logger.info("cors-config.json not found, using default CORS settings")
+# CORS configuration - CORS_ALLOWED_ORIGINS (comma-separated) takes precedence,
+# otherwise load from cors-config.json if available
+cors_allowed_origins = os.getenv("CORS_ALLOWED_ORIGINS")
+if cors_allowed_origins:
+    allowed_origins = tuple(origin.strip() for origin in cors_allowed_origins.split(",") if origin.strip())
+else:
+    try:
+        cors_config = orjson.loads(Path(__file__).parent.joinpath("cors-config.json").read_bytes())
+        allowed_origins = tuple(cors_config.get("allowed_origins", ["*"]))
+    except FileNotFoundError:
+        allowed_origins = ("*",)
+        logger.info("cors-config.json not found, using default CORS settings")
 
 app.add_middleware(
-    CORSMiddleware,
+    FastCORSMiddleware,
     allow_origins=allowed_origins,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    # Only what the frontend sends, so browsers can cache preflights for a day
+    allow_methods=["GET", "POST", "DELETE", "OPTIONS"],
+    allow_headers=["Content-Type"],
+    max_age=86400,
 )
 
+# Compress JSON responses, except the NDJSON streams that have to reach the client frame by frame
+STREAMING_PATHS = ("/api/process-s3-video", "/api/chat/message/stream")
+app.add_middleware(StreamingGZipMiddleware, excluded_paths=STREAMING_PATHS, minimum_size=1024, compresslevel=5)
+
 # Health check endpoint (early)
-@app.get("/")
+@app.get("/", include_in_schema=False)
 async def root():
     return {"message": "Refrigerator Diagnosis API", "version": "1.0.0", "status": "healthy"}
 
-@app.get("/health")
+# Probes hit /health every few seconds, so its timestamp is formatted once per second
+_health_second = 0
+_health_timestamp = ""
+
+def _utc_timestamp() -> str:
+    """Current UTC time as an ISO string, to the second"""
+    global _health_second, _health_timestamp
+    now = int(time.time())
+    if now != _health_second:
+        _health_second = now
+        _health_timestamp = datetime.fromtimestamp(now, timezone.utc).isoformat()
+    return _health_timestamp
+
+@app.get("/health", include_in_schema=False)
 async def health_check():
-    return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
+    return {"status": "healthy", "timestamp": _utc_timestamp()}
 
-# Import routers with error handling
-try:
-    from api.process_s3_video import router as refrigerator_router
-    app.include_router(refrigerator_router, prefix="/api")
-    logger.info("✅ Successfully loaded process_s3_video router")
-except Exception as e:
-    logger.error(f"❌ Failed to load process_s3_video router: {e}")
+class HealthCheckMiddleware:
+    """Answer probe requests for /health before the middleware stack and router"""
 
-try:
-    from api.upload import router as upload_router
-    app.include_router(upload_router, prefix="/api")
-    logger.info("✅ Successfully loaded upload router")
-except Exception as e:
-    logger.error(f"❌ Failed to load upload router: {e}")
+    def __init__(self, app: ASGIApp):
+        self.app = app
 
-try:
-    from api.history import router as history_router
-    app.include_router(history_router, prefix="/api")
-    logger.info("✅ Successfully loaded history router")
-except Exception as e:
-    logger.error(f"❌ Failed to load history router: {e}")
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # Browser checks carry an Origin header and still need CORS headers from the full stack
+        if (scope["type"] == "http" and scope["path"] == "/health" and scope["method"] == "GET"
+                and not any(name == b"origin" for name, _ in scope["headers"])):
+            body = orjson.dumps({"status": "healthy", "timestamp": _utc_timestamp()})
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-length", str(len(body)).encode("latin-1")),
+                    (b"content-type", b"application/json"),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+        await self.app(scope, receive, send)
 
-try:
-    from api.chat_router import router as chat_router
-    app.include_router(chat_router, prefix="/api")
-    logger.info("✅ Successfully loaded chat router")
-except Exception as e:
-    logger.error(f"❌ Failed to load chat router: {e}")
+# Added last so it wraps every other middleware
+app.add_middleware(HealthCheckMiddleware)
 
 if __name__ == "__main__":
+    # Auto-reload and access logs are for development; ENV=prod serves with
+    # WEB_CONCURRENCY workers and leaves logging to the application loggers
+    is_dev = ENV == "dev"
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=int(os.getenv("PORT", 8000)),
-        reload=True
-    ) 
\ No newline at end of file
+        loop="uvloop" if UVLOOP_AVAILABLE else "asyncio",
+        http="httptools" if HTTPTOOLS_AVAILABLE else "h11",
+        # The API serves no websockets; long keep-alive spares chat clients
+        # a reconnect (and CORS preflight) between streamed responses
+        ws="none",
+        timeout_keep_alive=75,
+        reload=is_dev,
+        workers=None if is_dev else int(os.getenv("WEB_CONCURRENCY", "1")),
+        access_log=is_dev,
+        log_level="info" if is_dev else "warning"
+    )
\ No newline at end of file
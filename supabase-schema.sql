@@ -110,4 +110,39 @@ ALTER TABLE chat_conversations DROP CONSTRAINT IF EXISTS chat_conversations_summ
 ALTER TABLE chat_conversations DROP COLUMN IF EXISTS summary_id;
 
 -- Create index for diagnosis_id
-CREATE INDEX IF NOT EXISTS idx_chat_conversations_diagnosis_id ON chat_conversations(diagnosis_id); 
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_chat_conversations_diagnosis_id ON chat_conversations(diagnosis_id); 
+
+-- Save a refrigerator diagnosis and return only its id, so the large text
+-- columns are not sent back to the API after the insert. created_at is left
+-- to the column default so timestamps come from the database clock.
+CREATE OR REPLACE FUNCTION save_diagnosis(diagnosis JSONB)
+RETURNS INTEGER AS $$
+    INSERT INTO refrigerator_diagnoses (
+        video_id, file_name, video_url, user_description, brand, model,
+        refrigerator_type, issue_category, severity_level, diagnosis_result,
+        solutions, audio_summary, ai_model
+    )
+    SELECT
+        video_id, file_name, video_url, user_description, brand, model,
+        refrigerator_type, issue_category, severity_level, diagnosis_result,
+        solutions, audio_summary, ai_model
+    FROM jsonb_populate_record(NULL::refrigerator_diagnoses, diagnosis)
+    RETURNING id;
+$$ LANGUAGE sql;
+
+-- camelCase view of refrigerator diagnoses served as-is by the history API.
+-- security_invoker keeps the table's RLS policies applied to the caller.
+CREATE OR REPLACE VIEW refrigerator_diagnoses_camel WITH (security_invoker = true) AS
+SELECT
+    id::text AS "id",
+    video_id AS "videoId",
+    file_name AS "fileName",
+    brand,
+    model,
+    issue_category AS "issueCategory",
+    severity_level AS "severityLevel",
+    COALESCE(diagnosis_result, '') AS "diagnosisResult",
+    COALESCE(solutions, '') AS "solutions",
+    audio_summary AS "audioSummary",
+    created_at AS "createdAt"
+FROM refrigerator_diagnoses;